@@ -0,0 +1,306 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+DB_PATH = "groups.db"
+
+# Har bir element sxemaning bitta versiyasi. Yangi o'zgarishlar faqat oxiriga qo'shiladi.
+MIGRATIONS = [
+    # 1: boshlang'ich jadvallar
+    [
+        "CREATE TABLE IF NOT EXISTS groups (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, chat_id INTEGER NOT NULL UNIQUE)",
+        "CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, group_id INTEGER, user_id INTEGER, type TEXT, banned_item TEXT, details TEXT)",
+    ],
+    # 2: statistika so'rovlari uchun qoplovchi indekslar
+    [
+        "CREATE INDEX IF NOT EXISTS idx_logs_timestamp_type ON logs (timestamp, type)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_timestamp_item ON logs (timestamp, banned_item)",
+    ],
+    # 3: soatlik yig'ma statistika jadvallari va ularni mavjud loglardan to'ldirish
+    [
+        "CREATE TABLE IF NOT EXISTS stats_hourly_type (hour TEXT NOT NULL, type TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (hour, type)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS stats_hourly_item (hour TEXT NOT NULL, banned_item TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (hour, banned_item)) WITHOUT ROWID",
+        "INSERT OR IGNORE INTO stats_hourly_type (hour, type, count) SELECT strftime('%Y-%m-%d %H:00:00', timestamp), COALESCE(type, ''), COUNT(*) FROM logs WHERE timestamp IS NOT NULL GROUP BY 1, 2",
+        "INSERT OR IGNORE INTO stats_hourly_item (hour, banned_item, count) SELECT strftime('%Y-%m-%d %H:00:00', timestamp), COALESCE(banned_item, ''), COUNT(*) FROM logs WHERE timestamp IS NOT NULL GROUP BY 1, 2",
+    ],
+    # 4: FSM holatlari (qayta ishga tushganda saqlanib qoladi)
+    [
+        "CREATE TABLE IF NOT EXISTS fsm_states (key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL, updated_at REAL NOT NULL) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states (updated_at)",
+    ],
+    # 5: taqiqlangan ro'yxatlar (Excel endi faqat import/eksport uchun)
+    [
+        "CREATE TABLE IF NOT EXISTS banned_items (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, item TEXT NOT NULL, UNIQUE (kind, item))",
+        "CREATE TABLE IF NOT EXISTS banned_sources (kind TEXT PRIMARY KEY, imported_at REAL NOT NULL)",
+    ],
+    # 6: import qilingan Excel faylning xeshi (o'zgarmagan fayl qayta o'qilmaydi)
+    [
+        "ALTER TABLE banned_sources ADD COLUMN source_hash TEXT",
+    ],
+    # 7: guruhga xos sozlamalar (faqat global configdan farq qiladigan qiymatlar, JSON)
+    [
+        "CREATE TABLE IF NOT EXISTS group_settings (chat_id INTEGER PRIMARY KEY, delete_settings TEXT NOT NULL DEFAULT '{}', welcome_settings TEXT NOT NULL DEFAULT '{}', updated_at REAL NOT NULL)",
+    ],
+    # 8: aniq media bloklari (file_unique_id yoki stiker to'plami nomi)
+    [
+        "CREATE TABLE IF NOT EXISTS banned_media (kind TEXT NOT NULL, value TEXT NOT NULL, added_by INTEGER, added_at REAL NOT NULL, PRIMARY KEY (kind, value)) WITHOUT ROWID",
+    ],
+    # 9: bot guruhga qo'shilgan vaqt (qayta ishga tushganda ham saqlanadi)
+    [
+        "ALTER TABLE groups ADD COLUMN joined_at REAL",
+    ],
+    # 10: fon tekshiruvidagi botning adminlik holati va tekshirilgan vaqt
+    [
+        "ALTER TABLE groups ADD COLUMN bot_is_admin INTEGER",
+        "ALTER TABLE groups ADD COLUMN admin_checked_at REAL",
+    ],
+    # 11: ro'yxat oxirgi import/eksportdan keyin bot orqali o'zgartirilganmi
+    [
+        "ALTER TABLE banned_sources ADD COLUMN modified INTEGER NOT NULL DEFAULT 0",
+    ],
+]
+
+def migrate(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    row = conn.execute("SELECT version FROM schema_version").fetchone()
+    if row is None:
+        conn.execute("INSERT INTO schema_version (version) VALUES (0)")
+        current = 0
+    else:
+        current = row[0]
+    conn.commit()
+    for version, statements in enumerate(MIGRATIONS, start=1):
+        if version <= current:
+            continue
+        # sqlite3 DDL oldidan o'zi BEGIN qilmaydi, shuning uchun tranzaksiya aniq ochiladi:
+        # migratsiya yarim qo'llanib qolmaydi
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute("UPDATE schema_version SET version = ?", (version,))
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        print(f"Baza sxemasi {version}-versiyaga yangilandi.")
+
+def open_db(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-16000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    migrate(conn)
+    return conn
+
+class Database:
+    # Barcha so'rovlar bitta alohida oqimda bajariladi, event loop bloklanmaydi
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+        self.conn = self.executor.submit(open_db, path).result()
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, self.conn, *args)
+
+    def close(self):
+        self.executor.submit(self.conn.close).result()
+        self.executor.shutdown(wait=True)
+
+def add_group(conn, name, chat_id):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO groups (name, chat_id) VALUES (?, ?)", (name, chat_id))
+        conn.commit()
+        return cursor.lastrowid
+    except sqlite3.IntegrityError:
+        return None
+
+def get_group_by_id(conn, gid):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM groups WHERE id = ?", (gid,))
+    return cursor.fetchone()
+
+def get_group_by_chat_id(conn, chat_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM groups WHERE chat_id = ?", (chat_id,))
+    return cursor.fetchone()
+
+def get_all_groups(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, name, chat_id FROM groups")
+    return cursor.fetchall()
+
+def get_group_join_times(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT chat_id, joined_at FROM groups WHERE joined_at IS NOT NULL")
+    return cursor.fetchall()
+
+def set_group_joined_at(conn, chat_id, joined_at):
+    with conn:
+        conn.execute("UPDATE groups SET joined_at = ? WHERE chat_id = ?", (joined_at, chat_id))
+
+def insert_logs(conn, batch):
+    # Loglar bilan birga soatlik yig'ma jadvallar ham shu tranzaksiyada yangilanadi
+    by_type = {}
+    by_item = {}
+    for timestamp, _, _, event_type, banned_item, _ in batch:
+        hour = timestamp[:13] + ":00:00"
+        key = (hour, event_type or "")
+        by_type[key] = by_type.get(key, 0) + 1
+        key = (hour, banned_item or "")
+        by_item[key] = by_item.get(key, 0) + 1
+    with conn:
+        conn.executemany(
+            "INSERT INTO logs (timestamp, group_id, user_id, type, banned_item, details) VALUES (?, ?, ?, ?, ?, ?)",
+            batch
+        )
+        conn.executemany(
+            "INSERT INTO stats_hourly_type (hour, type, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (hour, type) DO UPDATE SET count = count + excluded.count",
+            [(hour, event_type, count) for (hour, event_type), count in by_type.items()]
+        )
+        conn.executemany(
+            "INSERT INTO stats_hourly_item (hour, banned_item, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (hour, banned_item) DO UPDATE SET count = count + excluded.count",
+            [(hour, banned_item, count) for (hour, banned_item), count in by_item.items()]
+        )
+
+def get_stats(conn, since_hour):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(SUM(count), 0) FROM stats_hourly_type WHERE hour >= ?", (since_hour,))
+    total = cursor.fetchone()[0]
+
+    # Turlarga ko'ra
+    cursor.execute("SELECT type, SUM(count) FROM stats_hourly_type WHERE hour >= ? GROUP BY type", (since_hour,))
+    type_stats = cursor.fetchall()
+
+    # Eng ko'p taqiqlangan item
+    cursor.execute("SELECT banned_item, SUM(count) FROM stats_hourly_item WHERE hour >= ? GROUP BY banned_item ORDER BY SUM(count) DESC LIMIT 5", (since_hour,))
+    top_banned = cursor.fetchall()
+    return total, type_stats, top_banned
+
+def get_fsm_record(conn, key):
+    cursor = conn.cursor()
+    cursor.execute("SELECT state, data, updated_at FROM fsm_states WHERE key = ?", (key,))
+    return cursor.fetchone()
+
+def save_fsm_record(conn, key, state, data, updated_at):
+    with conn:
+        conn.execute(
+            "INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET state = excluded.state, data = excluded.data, updated_at = excluded.updated_at",
+            (key, state, data, updated_at)
+        )
+
+def delete_fsm_record(conn, key):
+    with conn:
+        conn.execute("DELETE FROM fsm_states WHERE key = ?", (key,))
+
+def purge_fsm_records(conn, older_than):
+    with conn:
+        return conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (older_than,)).rowcount
+
+def get_banned_items(conn, kind):
+    cursor = conn.cursor()
+    cursor.execute("SELECT item FROM banned_items WHERE kind = ? ORDER BY id", (kind,))
+    return [row[0] for row in cursor.fetchall()]
+
+def mark_banned_modified(conn, kind):
+    # Bazadagi ro'yxat Excel fayldan farq qila boshladi
+    conn.execute(
+        "INSERT INTO banned_sources (kind, imported_at, modified) VALUES (?, strftime('%s', 'now'), 1) "
+        "ON CONFLICT (kind) DO UPDATE SET modified = 1",
+        (kind,)
+    )
+
+def insert_banned_item(conn, kind, item):
+    with conn:
+        changed = conn.execute("INSERT OR IGNORE INTO banned_items (kind, item) VALUES (?, ?)", (kind, item)).rowcount > 0
+        if changed:
+            mark_banned_modified(conn, kind)
+        return changed
+
+def delete_banned_item(conn, kind, item):
+    with conn:
+        changed = conn.execute("DELETE FROM banned_items WHERE kind = ? AND item = ?", (kind, item)).rowcount > 0
+        if changed:
+            mark_banned_modified(conn, kind)
+        return changed
+
+def replace_banned_items(conn, kind, items, source_hash=None):
+    with conn:
+        conn.execute("DELETE FROM banned_items WHERE kind = ?", (kind,))
+        conn.executemany("INSERT OR IGNORE INTO banned_items (kind, item) VALUES (?, ?)", [(kind, item) for item in items])
+        conn.execute(
+            "INSERT OR REPLACE INTO banned_sources (kind, imported_at, source_hash, modified) VALUES (?, strftime('%s', 'now'), ?, 0)",
+            (kind, source_hash)
+        )
+
+def get_banned_source(conn, kind):
+    # Import qilinmagan bo'lsa None, aks holda (source_hash, modified)
+    cursor = conn.cursor()
+    cursor.execute("SELECT source_hash, modified FROM banned_sources WHERE kind = ?", (kind,))
+    return cursor.fetchone()
+
+def set_banned_source_hash(conn, kind, source_hash):
+    with conn:
+        conn.execute("UPDATE banned_sources SET source_hash = ? WHERE kind = ?", (source_hash, kind))
+
+def mark_banned_exported(conn, kind, source_hash):
+    # Eksport qilingan fayl bazadagi ro'yxat bilan bir xil
+    with conn:
+        conn.execute(
+            "INSERT INTO banned_sources (kind, imported_at, source_hash, modified) VALUES (?, strftime('%s', 'now'), ?, 0) "
+            "ON CONFLICT (kind) DO UPDATE SET source_hash = excluded.source_hash, modified = 0",
+            (kind, source_hash)
+        )
+
+def get_all_group_settings(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT chat_id, delete_settings, welcome_settings FROM group_settings")
+    return cursor.fetchall()
+
+def save_group_settings(conn, chat_id, delete_settings, welcome_settings):
+    with conn:
+        conn.execute(
+            "INSERT INTO group_settings (chat_id, delete_settings, welcome_settings, updated_at) VALUES (?, ?, ?, strftime('%s', 'now')) "
+            "ON CONFLICT (chat_id) DO UPDATE SET delete_settings = excluded.delete_settings, welcome_settings = excluded.welcome_settings, updated_at = excluded.updated_at",
+            (chat_id, delete_settings, welcome_settings)
+        )
+
+def delete_group_settings(conn, chat_id):
+    with conn:
+        conn.execute("DELETE FROM group_settings WHERE chat_id = ?", (chat_id,))
+
+def get_banned_media(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT kind, value FROM banned_media")
+    return cursor.fetchall()
+
+def insert_banned_media(conn, kind, value, added_by):
+    with conn:
+        return conn.execute(
+            "INSERT OR IGNORE INTO banned_media (kind, value, added_by, added_at) VALUES (?, ?, ?, strftime('%s', 'now'))",
+            (kind, value, added_by)
+        ).rowcount > 0
+
+def delete_banned_media(conn, kind, value):
+    with conn:
+        return conn.execute("DELETE FROM banned_media WHERE kind = ? AND value = ?", (kind, value)).rowcount > 0
+
+def save_admin_statuses(conn, rows):
+    # rows: [(bot_is_admin, admin_checked_at, chat_id), ...]
+    with conn:
+        conn.executemany("UPDATE groups SET bot_is_admin = ?, admin_checked_at = ? WHERE chat_id = ?", rows)
+
+def get_admin_snapshot(conn):
+    # (jami guruhlar, admin bo'lganlar, oxirgi tekshiruv vaqti, tekshirilmaganlar)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT COUNT(*), COALESCE(SUM(bot_is_admin), 0), MAX(admin_checked_at), "
+        "COALESCE(SUM(admin_checked_at IS NULL), 0) FROM groups"
+    )
+    return cursor.fetchone()
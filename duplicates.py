@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+
+
+class DuplicateDetector:
+    # Guruhlararo bir xil kontent (spam to'lqini) aniqlagichi. Kalit - normallashtirilgan
+    # matn yoki file_unique_id xeshi. Har bir xesh uchun `window` soniyalik oynada nechta
+    # turli guruhda ko'ringani sanaladi; `threshold` ga yetsa xesh `flag_ttl` soniya belgilanadi.
+    # Xeshlar chegaralangan LRU da saqlanadi, xotira `max_keys` bilan cheklangan.
+    __slots__ = ("threshold", "window", "flag_ttl", "max_keys", "entries")
+
+    def __init__(self, threshold=3, window=600, flag_ttl=3600, max_keys=100000):
+        self.threshold = threshold
+        self.window = window
+        self.flag_ttl = flag_ttl
+        self.max_keys = max_keys
+        self.entries = OrderedDict()
+
+    def configure(self, threshold, window, flag_ttl, max_keys):
+        self.threshold, self.window, self.flag_ttl, self.max_keys = threshold, window, flag_ttl, max_keys
+        while len(self.entries) > max_keys:
+            self.entries.popitem(last=False)
+
+    def hit(self, key, chat_id, now=None):
+        # (belgilangan, birinchi marta) qaytaradi
+        if now is None:
+            now = time.monotonic()
+        entries = self.entries
+        entry = entries.get(key)
+        if entry is None or (entry[2] <= now and now - entry[0] > self.window):
+            # [oyna boshi, guruhlar, belgilangan muddat oxiri]
+            entry = [now, set(), 0.0]
+            entries[key] = entry
+            if len(entries) > self.max_keys:
+                entries.popitem(last=False)
+        else:
+            entries.move_to_end(key)
+        if entry[2] > now:
+            return True, False
+        chats = entry[1]
+        chats.add(chat_id)
+        if len(chats) < self.threshold:
+            return False, False
+        entry[2] = now + self.flag_ttl
+        # Belgilangandan keyin guruhlar ro'yxati kerak emas
+        chats.clear()
+        return True, True
+
+    def __len__(self):
+        return len(self.entries)
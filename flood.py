@@ -0,0 +1,48 @@
+import time
+from collections import OrderedDict, deque
+
+
+class FloodDetector:
+    # Har bir (chat, foydalanuvchi) uchun oxirgi `limit` ta xabar vaqti halqa buferda
+    # (deque maxlen) saqlanadi. Bufer to'lib, eng eski xabar `window` soniya ichida
+    # bo'lsa - flood. Har bir xabar O(1); uzoq jim turgan kalitlar LRU bo'yicha chiqariladi.
+    __slots__ = ("limit", "window", "max_keys", "entries")
+
+    def __init__(self, limit=10, window=10, max_keys=50000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.entries = OrderedDict()
+
+    def configure(self, limit, window, max_keys):
+        if limit != self.limit:
+            # Bufer uzunligi o'zgardi, eski hisoblagichlar yaroqsiz
+            self.entries.clear()
+        self.limit, self.window, self.max_keys = limit, window, max_keys
+        while len(self.entries) > max_keys:
+            self.entries.popitem(last=False)
+
+    def hit(self, key, now=None):
+        # (flood, birinchi marta) qaytaradi; "birinchi marta" jazo faqat bir marta berilishi uchun
+        if now is None:
+            now = time.monotonic()
+        entries = self.entries
+        entry = entries.get(key)
+        if entry is None:
+            entry = [deque(maxlen=self.limit), 0.0]
+            entries[key] = entry
+            if len(entries) > self.max_keys:
+                entries.popitem(last=False)
+        else:
+            entries.move_to_end(key)
+        stamps = entry[0]
+        stamps.append(now)
+        if len(stamps) < self.limit or now - stamps[0] > self.window:
+            return False, False
+        first = now >= entry[1]
+        # Oyna davomida keyingi xabarlar ham flood hisoblanadi, lekin qayta jazolanmaydi
+        entry[1] = now + self.window
+        return True, first
+
+    def __len__(self):
+        return len(self.entries)
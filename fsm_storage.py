@@ -0,0 +1,80 @@
+import json
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+
+from database import get_fsm_record, save_fsm_record, delete_fsm_record, purge_fsm_records
+
+EMPTY_RECORD = (None, {}, 0.0)
+
+
+class SQLiteStorage(BaseStorage):
+    # FSM holatlari groups.db da saqlanadi, oxirgi ishlatilganlari LRU keshda turadi.
+    # Yozish darhol bazaga ham o'tadi (write-through), tashlab ketilgan holatlar TTL bilan o'chadi.
+    def __init__(self, db, ttl=24 * 3600, cache_size=10000):
+        self.db = db
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # key -> (state, data, updated_at)
+
+    @staticmethod
+    def make_key(key):
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id}:{key.business_connection_id}:{key.destiny}"
+
+    def remember(self, db_key, record):
+        self.cache[db_key] = record
+        self.cache.move_to_end(db_key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def get_record(self, key):
+        db_key = self.make_key(key)
+        record = self.cache.get(db_key)
+        if record is None:
+            row = await self.db.run(get_fsm_record, db_key)
+            # Holati yo'q foydalanuvchilar ham keshlanadi, keyingi xabarlarda bazaga murojaat qilinmaydi
+            record = (row[0], json.loads(row[1]), row[2]) if row else EMPTY_RECORD
+            self.remember(db_key, record)
+        else:
+            self.cache.move_to_end(db_key)
+        if record[2] and record[2] + self.ttl < time.time():
+            record = EMPTY_RECORD
+            self.remember(db_key, record)
+            await self.db.run(delete_fsm_record, db_key)
+        return db_key, record
+
+    async def write_record(self, db_key, state, data):
+        if state is None and not data:
+            self.remember(db_key, EMPTY_RECORD)
+            await self.db.run(delete_fsm_record, db_key)
+            return
+        updated_at = time.time()
+        self.remember(db_key, (state, data, updated_at))
+        await self.db.run(save_fsm_record, db_key, state, json.dumps(data, ensure_ascii=False), updated_at)
+
+    async def set_state(self, key, state=None):
+        db_key, record = await self.get_record(key)
+        state = state.state if isinstance(state, State) else state
+        await self.write_record(db_key, state, record[1])
+
+    async def get_state(self, key):
+        _, record = await self.get_record(key)
+        return record[0]
+
+    async def set_data(self, key, data):
+        db_key, record = await self.get_record(key)
+        await self.write_record(db_key, record[0], dict(data))
+
+    async def get_data(self, key):
+        _, record = await self.get_record(key)
+        return dict(record[1])
+
+    async def purge_expired(self):
+        removed = await self.db.run(purge_fsm_records, time.time() - self.ttl)
+        if removed:
+            print(f"Eskirgan FSM holatlari o'chirildi: {removed} ta")
+
+    async def close(self):
+        self.cache.clear()
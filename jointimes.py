@@ -0,0 +1,28 @@
+from array import array
+
+
+class JoinTimes:
+    # Bot guruhga qo'shilgan vaqtlar: chat_id -> massivdagi o'rin, vaqtlar esa array('d') da.
+    # Har bir guruh uchun bitta kichik int va 8 bayt; qidiruv O(1).
+    __slots__ = ("slots", "times")
+
+    def __init__(self, rows=()):
+        self.slots = {}
+        self.times = array('d')
+        for chat_id, joined_at in rows:
+            self.set(chat_id, joined_at)
+
+    def get(self, chat_id, default=0.0):
+        slot = self.slots.get(chat_id)
+        return default if slot is None else self.times[slot]
+
+    def set(self, chat_id, joined_at):
+        slot = self.slots.get(chat_id)
+        if slot is None:
+            self.slots[chat_id] = len(self.times)
+            self.times.append(joined_at)
+        else:
+            self.times[slot] = joined_at
+
+    def __len__(self):
+        return len(self.slots)
@@ -1,30 +1,76 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # Ishga tushish vaqtini o'lchash uchun
+
 from aiohttp import web
 import asyncio
 import os
 import json
 import io
 from dotenv import load_dotenv
-import sqlite3
-import pandas as pd
-from openpyxl import Workbook
 from aiogram import Bot, Dispatcher, Router, types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import BufferedInputFile
-from datetime import datetime, timedelta
+from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest, TelegramForbiddenError
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
 import pytz
-import time
 import re  # Link tekshirish uchun
+import multiprocessing
+import signal
+import contextlib
+import contextvars
+import hashlib
+from collections import OrderedDict
+from matcher import BannedMatcher
+from normalize import normalize, tokenize
+from ratelimit import TokenBucket
+from flood import FloodDetector
+from duplicates import DuplicateDetector
+from jointimes import JoinTimes
+from priority import HIGH, LOW, PriorityGate, PriorityRequestMiddleware, JobRunner, request_priority
+from fsm_storage import SQLiteStorage
+from snapshot import content_hash, file_hash, load_snapshot, save_snapshot
+from database import (
+    Database, add_group, get_all_groups, insert_logs, get_stats,
+    get_banned_items, insert_banned_item, delete_banned_item, replace_banned_items, get_banned_source, set_banned_source_hash, mark_banned_exported,
+    get_all_group_settings, save_group_settings, delete_group_settings,
+    get_banned_media, insert_banned_media, delete_banned_media,
+    get_group_join_times, set_group_joined_at, save_admin_statuses, get_admin_snapshot
+)
 
 load_dotenv()
 API_TOKEN = os.getenv("BOT_TOKEN")
+# WEBHOOK_URL berilsa bot polling o'rniga webhook rejimida ishlaydi
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Webhook rejimida majburiy: Telegram uni har so'rovda qaytaradi, barcha jarayonlarda bir xil bo'lishi kerak
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Webhook rejimida guruhlar shuncha ishchi jarayonga chat_id bo'yicha taqsimlanadi
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+worker_index = None
+worker_queues = None
+# Ishchilardan asosiy jarayonga konfiguratsiya o'zgarishlari uchun navbat
+master_queue = None
 
 ADMIN_IDS = []
 delete_settings = {}
 welcome_settings = {}
-joined_times = {}
+alert_settings = {}
+fuzzy_settings = {}
+flood_settings = {}
+flood_detector = FloodDetector()
+duplicate_settings = {}
+duplicate_detector = DuplicateDetector()
+raid_settings = {}
+join_rate = FloodDetector()  # Guruhga qo'shilish tezligi uchun xuddi shu siljuvchi oyna
+joined_times = JoinTimes()  # chat_id -> bot guruhga qo'shilgan vaqt (bazadan yuklanadi)
+# Guruhga xos sozlamalar: faqat global configdan farqlar (bazadan yuklanadi)
+# va chat_id bo'yicha tayyor (delete_settings, welcome_settings) juftligi
+group_overrides = {}
+group_settings_cache = {}
+
+RAID_MAX_CHATS = 10000
 
 class WelcomeStates(StatesGroup):
     waiting_for_message = State()
@@ -38,8 +84,8 @@ class BannedStates(StatesGroup):
     waiting_for_add_file = State()
     waiting_for_del_file = State()
 
-def load_config():
-    global ADMIN_IDS, delete_settings, welcome_settings
+def apply_config(data):
+    global ADMIN_IDS, delete_settings, welcome_settings, alert_settings, fuzzy_settings, flood_settings, duplicate_settings, raid_settings
     default_delete = {
         "text": "allow",
         "audio": "allow",
@@ -50,7 +96,9 @@ def load_config():
         "document": "allow",
         "link": "allow",
         "poll": "allow",
-        "file": "allow"
+        "file": "allow",
+        # /ban_media bilan bloklangan aniq rasm, stiker, video va ovozli xabarlar
+        "media": "delete"
     }
     default_welcome = {
         "enabled": True,
@@ -58,43 +106,121 @@ def load_config():
         "mute_enabled": True,
         "mute_duration": 300
     }
+    default_alert = {
+        # Bir xil (guruh, foydalanuvchi, taqiq) ogohlantirishlari shu oynada bitta xulosaga yig'iladi
+        "digest_window": 60
+    }
+    default_fuzzy = {
+        # Xato yozilgan taqiqlangan so'zlarni ham topish (bigram indeksi orqali)
+        "enabled": False,
+        # [minimal so'z uzunligi, ruxsat etilgan maksimal tahrir masofasi]
+        "distances": [[5, 1], [9, 2]],
+        "cache_size": 10000
+    }
+    default_flood = {
+        # `window` soniya ichida `limit` ta xabar yuborgan foydalanuvchi flood qilgan hisoblanadi
+        "enabled": False,
+        "limit": 10,
+        "window": 10,
+        # delete - xabarlarni o'chirish, mute - yozishni cheklash, alert - adminlarga xabar
+        "actions": ["delete", "mute", "alert"],
+        "mute_duration": 300,
+        # Xotirada kuzatiladigan (guruh, foydalanuvchi) juftliklari soni
+        "max_tracked": 50000
+    }
+    default_duplicate = {
+        # Bir xil matn yoki fayl `window` soniyada `threshold` ta turli guruhda ko'rinsa spam deb belgilanadi
+        "enabled": False,
+        "threshold": 3,
+        "window": 600,
+        # Belgilangan kontentning keyingi nusxalari shuncha soniya davomida o'chiriladi
+        "flag_ttl": 3600,
+        # Qisqa matnlar ("salom", "rahmat") hisobga olinmaydi
+        "min_text_length": 30,
+        "max_tracked": 100000
+    }
+    default_raid = {
+        # `join_window` soniyada `join_limit` tadan ko'p a'zo qo'shilsa guruh lockdown rejimiga o'tadi
+        "enabled": False,
+        "join_limit": 10,
+        "join_window": 30,
+        "lockdown_duration": 600,
+        # Lockdown paytida qo'shilganlar shuncha soniya yozolmaydi
+        "mute_duration": 3600,
+        # Lockdown paytida welcome shu kechikish bilan bitta umumiy xabar qilib yuboriladi
+        "welcome_delay": 30,
+        # Lockdown paytida qo'shilib, shuncha soniya ichida yozganlar ban qilinadi (0 - o'chiq)
+        "autoban_seconds": 0
+    }
+    ADMIN_IDS = data.get("ADMIN_IDS", [1223308504])
+    loaded_delete = data.get("delete_settings", {})
+    delete_settings = {**default_delete, **loaded_delete}
+    loaded_welcome = data.get("welcome_settings", {})
+    welcome_settings = {**default_welcome, **loaded_welcome}
+    loaded_alert = data.get("alert_settings", {})
+    alert_settings = {**default_alert, **loaded_alert}
+    loaded_fuzzy = data.get("fuzzy_settings", {})
+    fuzzy_settings = {**default_fuzzy, **loaded_fuzzy}
+    loaded_flood = data.get("flood_settings", {})
+    flood_settings = {**default_flood, **loaded_flood}
+    flood_detector.configure(max(1, int(flood_settings["limit"])), flood_settings["window"], flood_settings["max_tracked"])
+    loaded_duplicate = data.get("duplicate_settings", {})
+    duplicate_settings = {**default_duplicate, **loaded_duplicate}
+    duplicate_detector.configure(
+        max(1, int(duplicate_settings["threshold"])), duplicate_settings["window"],
+        duplicate_settings["flag_ttl"], duplicate_settings["max_tracked"]
+    )
+    loaded_raid = data.get("raid_settings", {})
+    raid_settings = {**default_raid, **loaded_raid}
+    join_rate.configure(max(1, int(raid_settings["join_limit"])), raid_settings["join_window"], RAID_MAX_CHATS)
+    # Global qiymatlar o'zgardi, guruhlarning samarali sozlamalari qayta hisoblanadi
+    group_settings_cache.clear()
+
+def load_config():
     if os.path.exists('config.json'):
-        with open('config.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        ADMIN_IDS = data.get("ADMIN_IDS", [1223308504])
-        loaded_delete = data.get("delete_settings", {})
-        delete_settings = {**default_delete, **loaded_delete}
-        loaded_welcome = data.get("welcome_settings", {})
-        welcome_settings = {**default_welcome, **loaded_welcome}
+        apply_config(read_config_file())
     else:
-        ADMIN_IDS = [1223308504]
-        delete_settings = default_delete
-        welcome_settings = default_welcome
+        apply_config({})
         save_config()
 
-def save_config():
-    data = {
+def config_snapshot():
+    return {
         "ADMIN_IDS": ADMIN_IDS,
         "delete_settings": delete_settings,
-        "welcome_settings": welcome_settings
+        "welcome_settings": welcome_settings,
+        "alert_settings": alert_settings,
+        "fuzzy_settings": fuzzy_settings,
+        "flood_settings": flood_settings,
+        "duplicate_settings": duplicate_settings,
+        "raid_settings": raid_settings
     }
+
+def save_config():
+    data = config_snapshot()
     with open('config.json', 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=4, ensure_ascii=False)
+    remember_mtime('config.json')
+    group_settings_cache.clear()
+    publish_snapshot("config", data)
 
-def init_db():
-    conn = sqlite3.connect("groups.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "CREATE TABLE IF NOT EXISTS groups (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, chat_id INTEGER NOT NULL UNIQUE)"
-    )
-    cursor.execute(
-        "CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, group_id INTEGER, user_id INTEGER, type TEXT, banned_item TEXT, details TEXT)"
-    )
-    conn.commit()
-    return conn
+def read_config_file():
+    with open('config.json', 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def publish_snapshot(kind, payload):
+    # Ko'p jarayonli rejimda o'zgarish qolgan ishchilarga ham yuboriladi
+    if worker_queues is None:
+        return
+    for index, queue in enumerate(worker_queues):
+        if index != worker_index:
+            queue.put((kind, payload))
+    if kind == "config" and master_queue is not None:
+        # Asosiy jarayon spam to'lqinlarini sanaydi, unga ham sozlamalar kerak
+        master_queue.put((kind, payload))
 
 def create_empty_excel(file_path):
     try:
+        from openpyxl import Workbook
         wb = Workbook()
         wb.save(file_path)
         print(f"{file_path} fayli yaratildi.")
@@ -107,139 +233,870 @@ def check_and_create_files():
         if not os.path.exists(file):
             create_empty_excel(file)
 
-def add_group(conn, name, chat_id):
-    cursor = conn.cursor()
-    try:
-        cursor.execute("INSERT INTO groups (name, chat_id) VALUES (?, ?)", (name, chat_id))
-        conn.commit()
-        return cursor.lastrowid
-    except sqlite3.IntegrityError:
-        return None
-
-def get_group_by_id(conn, gid):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM groups WHERE id = ?", (gid,))
-    return cursor.fetchone()
-
-def get_group_by_chat_id(conn, chat_id):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM groups WHERE chat_id = ?", (chat_id,))
-    return cursor.fetchone()
-
-def get_all_groups(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM groups")
-    return cursor.fetchall()
-
-def load_banned_words(file_path="taqiq.xlsx"):
+def load_banned_words(file_path="taqiq.xlsx", strict=False):
     try:
+        import pandas as pd  # Og'ir kutubxona faqat Excel import paytida yuklanadi
         df = pd.read_excel(file_path, usecols=[0], header=None)
-        words = df[0].dropna().str.lower().str.strip().tolist()
+        words = df[0].dropna().astype(str).str.lower().str.strip().tolist()
         print(f"Yuklangan taqiqlangan so'zlar: {words}")
         return words
     except Exception as e:
         print(f"Taqiqlangan so'zlar yuklashda xato: {e}")
+        if strict:
+            raise
         return []
 
-def load_banned_audio_names(file_path="taqiq_audio.xlsx"):
+def load_banned_audio_names(file_path="taqiq_audio.xlsx", strict=False):
     try:
+        import pandas as pd  # Og'ir kutubxona faqat Excel import paytida yuklanadi
         df = pd.read_excel(file_path, usecols=[0], header=None)
-        audios = df[0].dropna().str.lower().str.strip().tolist()
+        audios = df[0].dropna().astype(str).str.lower().str.strip().tolist()
         print(f"Yuklangan taqiqlangan audio nomlari: {audios}")
         return audios
     except Exception as e:
         print(f"Taqiqlangan audio yuklashda xato: {e}")
+        if strict:
+            raise
         return []
 
-def load_banned_file_names(file_path="all.xlsx"):
+def load_banned_file_names(file_path="all.xlsx", strict=False):
     try:
+        import pandas as pd  # Og'ir kutubxona faqat Excel import paytida yuklanadi
         df = pd.read_excel(file_path, usecols=[0], header=None)
-        files = df[0].dropna().str.lower().str.strip().tolist()
+        files = df[0].dropna().astype(str).str.lower().str.strip().tolist()
         print(f"Yuklangan taqiqlangan fayl nomlari: {files}")
         return files
     except Exception as e:
         print(f"Taqiqlangan fayllar yuklashda xato: {e}")
+        if strict:
+            raise
         return []
 
-def update_banned_list(file_path, new_item=None, remove_item=None):
-    try:
-        if os.path.exists(file_path):
-            df = pd.read_excel(file_path, usecols=[0], header=None)
+def export_banned_excel(file_path, items):
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    for item in items:
+        ws.append([item])
+    wb.save(file_path)
+
+# Taqiqlangan ro'yxatlar bazada saqlanadi, Excel fayllar faqat import/eksport uchun
+BANNED_FILES = {
+    "word": "taqiq.xlsx",
+    "audio": "taqiq_audio.xlsx",
+    "file": "all.xlsx"
+}
+BANNED_LOADERS = {
+    "word": load_banned_words,
+    "audio": load_banned_audio_names,
+    "file": load_banned_file_names
+}
+BANNED_MATCHERS = {kind: BannedMatcher([]) for kind in BANNED_FILES}
+
+async def set_banned_list(kind, items):
+    # Matcher alohida oqimda quriladi va tayyor bo'lgach bitta o'zlashtirish bilan almashtiriladi,
+    # shuning uchun check_messages hech qachon yarim yuklangan ro'yxatni ko'rmaydi
+    BANNED_MATCHERS[kind] = await asyncio.to_thread(BannedMatcher, items)
+
+def read_banned_list(kind):
+    # Fayl bir marta o'qiladi: xesh va pandas bir xil baytlardan foydalanadi.
+    # O'qib bo'lmasa xato ko'tariladi - bazadagi yagona nusxa bo'sh ro'yxat bilan almashtirilmaydi
+    file_path = BANNED_FILES[kind]
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    source_hash = content_hash(data)
+    cached = load_snapshot(file_path, source_hash)
+    if cached is not None:
+        # Workbook o'zgarmagan, tayyor snapshot pandas'siz yuklanadi
+        items, matcher = cached
+        return items, matcher, source_hash
+    items = BANNED_LOADERS[kind](io.BytesIO(data), strict=True)
+    items = [item for item in dict.fromkeys(items) if item]
+    matcher = BannedMatcher(items)
+    save_snapshot(file_path, source_hash, items, matcher)
+    return items, matcher, source_hash
+
+async def import_banned_list(kind):
+    items, matcher, source_hash = await asyncio.to_thread(read_banned_list, kind)
+    await db.run(replace_banned_items, kind, items, source_hash)
+    BANNED_MATCHERS[kind] = matcher
+    publish_snapshot("banned", (kind, items))
+
+def warn_banned_conflict(file_path):
+    # Bot orqali qo'shilgan/o'chirilgan elementlar faqat bazada: fayl ularni jimgina o'chirib yubormasligi kerak
+    text = (
+        f"{file_path} o'zgardi, lekin ro'yxat oxirgi import/eksportdan keyin bot orqali ham o'zgartirilgan. "
+        "Ma'lumot yo'qolmasligi uchun fayl avtomatik import qilinmadi.\n"
+        "Faylni /export_lists bilan olib tahrirlang yoki /update_lists bilan fayldagi ro'yxatni majburan import qiling."
+    )
+    print(text)
+    notify_admins(text)
+
+async def load_banned_lists():
+    for kind, file_path in BANNED_FILES.items():
+        source = await db.run(get_banned_source, kind)
+        source_hash = await asyncio.to_thread(file_hash, file_path)
+        changed = source is not None and source[0] is not None and source_hash is not None and source[0] != source_hash
+        if changed and source[1]:
+            warn_banned_conflict(file_path)
+        elif source is None or changed:
+            # Birinchi ishga tushishda yoki bot o'chiq paytida workbook o'zgargan bo'lsa import qilinadi
+            try:
+                await import_banned_list(kind)
+                continue
+            except Exception as e:
+                print(f"{file_path} ni import qilib bo'lmadi, bazadagi ro'yxat ishlatiladi: {e}")
+        if source is not None and source[0] is None and source_hash is not None:
+            # Eski bazada xesh yo'q: ro'yxat bazadan olinadi, faqat xesh yozib qo'yiladi
+            await db.run(set_banned_source_hash, kind, source_hash)
+        items = await db.run(get_banned_items, kind)
+        cached = await asyncio.to_thread(load_snapshot, file_path, source_hash)
+        if cached is not None and cached[0] == items:
+            # Bazadagi ro'yxat snapshot bilan bir xil, kompilyatsiya qilingan matcher qayta ishlatiladi
+            BANNED_MATCHERS[kind] = cached[1]
         else:
-            df = pd.DataFrame(columns=[0])
-        if remove_item:
-            df = df[df[0] != remove_item]
-        if new_item:
-            new_row = pd.DataFrame({0: [new_item]})
-            df = pd.concat([df, new_row], ignore_index=True)
-        df.to_excel(file_path, index=False, header=False)
-        global BANNED_WORDS, BANNED_AUDIO_NAMES, BANNED_FILE_NAMES
-        if file_path == "taqiq.xlsx":
-            BANNED_WORDS = load_banned_words()
-        elif file_path == "taqiq_audio.xlsx":
-            BANNED_AUDIO_NAMES = load_banned_audio_names()
-        elif file_path == "all.xlsx":
-            BANNED_FILE_NAMES = load_banned_file_names()
-    except Exception as e:
-        print(f"Ro'yxatni yangilashda xato: {e}")
+            await set_banned_list(kind, items)
+
+async def add_banned_item(kind, item):
+    if item and await db.run(insert_banned_item, kind, item):
+        BANNED_MATCHERS[kind].add(item)
+        publish_snapshot("banned_add", (kind, item))
+
+async def remove_banned_item(kind, item):
+    if await db.run(delete_banned_item, kind, item):
+        BANNED_MATCHERS[kind].remove(item)
+        publish_snapshot("banned_remove", (kind, item))
+
+# Aniq media bloklari: ("file", file_unique_id) yoki ("set", stiker to'plami nomi)
+banned_media = set()
+
+async def load_banned_media():
+    rows = await db.run(get_banned_media)
+    banned_media.clear()
+    banned_media.update(rows)
+
+async def add_banned_media(kind, value, added_by):
+    if await db.run(insert_banned_media, kind, value, added_by):
+        banned_media.add((kind, value))
+        publish_snapshot("media_add", (kind, value))
+        return True
+    return False
+
+async def remove_banned_media(kind, value):
+    if await db.run(delete_banned_media, kind, value):
+        banned_media.discard((kind, value))
+        publish_snapshot("media_remove", (kind, value))
+        return True
+    return False
+
+def media_keys(message):
+    if message.sticker:
+        keys = [("file", message.sticker.file_unique_id)]
+        if message.sticker.set_name:
+            keys.append(("set", message.sticker.set_name))
+        return keys
+    media = message.photo[-1] if message.photo else (
+        message.video or message.animation or message.voice or message.video_note or message.document or message.audio
+    )
+    return [("file", media.file_unique_id)] if media is not None else []
 
-BANNED_WORDS = load_banned_words()
-BANNED_AUDIO_NAMES = load_banned_audio_names()
-BANNED_FILE_NAMES = load_banned_file_names()
+def find_banned_media(message):
+    for key in media_keys(message):
+        if key in banned_media:
+            return key
+    return None
+
+# Excel fayllar va config.json o'zgarishi mtime bo'yicha kuzatiladi
+WATCH_INTERVAL = 5
+watched_mtimes = {}
+file_watcher_task = None
+
+def get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def remember_mtime(path):
+    # Botning o'zi yozgan faylni qayta yuklamaslik uchun
+    watched_mtimes[path] = get_mtime(path)
+
+async def reload_changed_file(path):
+    if path == 'config.json':
+        data = await asyncio.to_thread(read_config_file)
+        apply_config(data)
+        publish_snapshot("config", config_snapshot())
+        print("config.json qayta yuklandi.")
+        return
+    for kind, file_path in BANNED_FILES.items():
+        if file_path == path:
+            source = await db.run(get_banned_source, kind)
+            if source is not None and source[1]:
+                warn_banned_conflict(path)
+                return
+            # Chala yozilgan faylni o'qib bo'lmasa, joriy ro'yxat o'zgarmaydi
+            await import_banned_list(kind)
+            print(f"{path} o'zgargani uchun qayta import qilindi ({len(BANNED_MATCHERS[kind])} ta).")
+
+async def watch_files():
+    paths = ['config.json', *BANNED_FILES.values()]
+    for path in paths:
+        remember_mtime(path)
+    while True:
+        await asyncio.sleep(WATCH_INTERVAL)
+        for path in paths:
+            mtime = get_mtime(path)
+            if mtime is None or mtime == watched_mtimes.get(path):
+                continue
+            watched_mtimes[path] = mtime
+            try:
+                await reload_changed_file(path)
+            except Exception as e:
+                print(f"{path} ni qayta yuklashda xato: {e}")
+
+async def start_file_watcher():
+    global file_watcher_task
+    # Ko'p jarayonli rejimda faqat birinchi ishchi kuzatadi, qolganlari snapshot oladi
+    if worker_index not in (None, 0) or file_watcher_task is not None:
+        return
+    file_watcher_task = asyncio.create_task(watch_files())
+
+async def stop_file_watcher():
+    global file_watcher_task
+    if file_watcher_task is not None:
+        file_watcher_task.cancel()
+        file_watcher_task = None
+
+GROUP_SETTING_SECTIONS = ("delete_settings", "welcome_settings")
+
+def get_group_settings(chat_id):
+    # Keshda bo'lsa bitta lug'at murojaati, aks holda global sozlamalar guruh farqlari bilan birlashtiriladi
+    settings = group_settings_cache.get(chat_id)
+    if settings is None:
+        overrides = group_overrides.get(chat_id, {})
+        settings = (
+            {**delete_settings, **overrides.get("delete_settings", {})},
+            {**welcome_settings, **overrides.get("welcome_settings", {})}
+        )
+        group_settings_cache[chat_id] = settings
+    return settings
+
+def set_group_overrides(chat_id, overrides):
+    if any(overrides.get(section) for section in GROUP_SETTING_SECTIONS):
+        group_overrides[chat_id] = overrides
+    else:
+        group_overrides.pop(chat_id, None)
+    group_settings_cache.pop(chat_id, None)
+
+async def load_group_settings():
+    rows = await db.run(get_all_group_settings)
+    group_overrides.clear()
+    group_settings_cache.clear()
+    for chat_id, delete_json, welcome_json in rows:
+        set_group_overrides(chat_id, {
+            "delete_settings": json.loads(delete_json),
+            "welcome_settings": json.loads(welcome_json)
+        })
+
+async def update_group_setting(chat_id, section, key, value):
+    # value None bo'lsa guruh qiymati o'chiriladi va global qiymat qo'llanadi
+    current = group_overrides.get(chat_id, {})
+    overrides = {name: dict(current.get(name, {})) for name in GROUP_SETTING_SECTIONS}
+    if value is None:
+        overrides[section].pop(key, None)
+    else:
+        overrides[section][key] = value
+    await store_group_overrides(chat_id, overrides)
+
+async def store_group_overrides(chat_id, overrides):
+    if any(overrides.values()):
+        await db.run(
+            save_group_settings, chat_id,
+            json.dumps(overrides["delete_settings"], ensure_ascii=False),
+            json.dumps(overrides["welcome_settings"], ensure_ascii=False)
+        )
+    else:
+        await db.run(delete_group_settings, chat_id)
+    set_group_overrides(chat_id, overrides)
+    publish_snapshot("group_settings", (chat_id, overrides))
+
+async def load_joined_times():
+    for chat_id, joined_at in await db.run(get_group_join_times):
+        joined_times.set(chat_id, joined_at)
+
+async def set_joined_time(chat_id, joined_at):
+    joined_times.set(chat_id, joined_at)
+    await db.run(set_group_joined_at, chat_id, joined_at)
+
+# Chiquvchi API so'rovlari ustuvorlik bo'yicha navbatlanadi: moderatsiya birinchi,
+# admin hisobotlari esa cheklangan sonli past ustuvorlikdagi fon ishlari sifatida
+API_CONCURRENCY = 16
+LOW_API_CONCURRENCY = 2
+ADMIN_JOB_CONCURRENCY = 2
 
 bot = Bot(token=API_TOKEN)
-storage = MemoryStorage()
+api_gate = PriorityGate(API_CONCURRENCY, LOW_API_CONCURRENCY)
+bot.session.middleware(PriorityRequestMiddleware(api_gate))
+admin_jobs = JobRunner(ADMIN_JOB_CONCURRENCY)
+db = Database()
+storage = SQLiteStorage(db)
 dp = Dispatcher(storage=storage)
+dp.startup.register(storage.purge_expired)
+dp.startup.register(load_banned_lists)
+dp.startup.register(load_group_settings)
+dp.startup.register(load_banned_media)
+dp.startup.register(load_joined_times)
+dp.startup.register(start_file_watcher)
+dp.shutdown.register(stop_file_watcher)
+
+def report_startup(stage):
+    print(f"⏱ {stage}: {time.perf_counter() - STARTUP_STARTED:.2f} s")
+
+async def on_bot_ready():
+    report_startup("Bot tayyor (ro'yxatlar yuklandi)")
+
+dp.startup.register(on_bot_ready)
+dp.shutdown.register(admin_jobs.stop)
 router = Router()
 dp.include_router(router)
-conn = init_db()
 
-def log_banned_event(group_id, user_id, event_type, banned_item, details=""):
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO logs (group_id, user_id, type, banned_item, details) VALUES (?, ?, ?, ?, ?)",
-        (group_id, user_id, event_type, banned_item, details)
+# Loglar navbat orqali fon vazifasida to'plam bo'lib yoziladi
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 200
+LOG_FLUSH_INTERVAL = 1.0
+log_queue = asyncio.Queue(maxsize=LOG_QUEUE_SIZE)
+log_writer_task = None
+
+async def log_banned_event(group_id, user_id, event_type, banned_item, details=""):
+    # Vaqt CURRENT_TIMESTAMP bilan bir xil formatda (UTC) hodisa paytida olinadi
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    # Navbat to'lsa, yozuvchi bo'shatguncha kutamiz
+    await log_queue.put((timestamp, group_id, user_id, event_type, banned_item, details))
+
+async def flush_logs(batch):
+    try:
+        await db.run(insert_logs, batch)
+    except Exception as e:
+        print(f"Loglarni yozishda xato ({len(batch)} ta): {e}")
+
+async def log_writer():
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        item = await log_queue.get()
+        if item is None:
+            break
+        batch = [item]
+        deadline = loop.time() + LOG_FLUSH_INTERVAL
+        while len(batch) < LOG_BATCH_SIZE:
+            if log_queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(log_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = log_queue.get_nowait()
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+        await flush_logs(batch)
+
+def start_log_writer():
+    global log_writer_task
+    if log_writer_task is None:
+        log_writer_task = asyncio.create_task(log_writer())
+
+async def stop_log_writer():
+    # Navbatda qolgan barcha loglar yozilib bo'lgach qaytadi
+    global log_writer_task
+    task = log_writer_task
+    if task is None:
+        return
+    log_writer_task = None
+    await log_queue.put(None)
+    await task
+
+dp.shutdown.register(stop_log_writer)
+
+# Adminlarga ogohlantirishlar navbat va ishchilar orqali Telegram limitlariga mos yuboriladi
+NOTIFY_QUEUE_SIZE = 1000
+NOTIFY_WORKERS = 4
+NOTIFY_MAX_RETRIES = 3
+NOTIFY_CAPTION_LIMIT = 1024
+notify_queue = asyncio.Queue(maxsize=NOTIFY_QUEUE_SIZE)
+notify_global_bucket = TokenBucket(25)  # Telegram: ~30 xabar/soniya
+notify_chat_buckets = {}  # chat_id -> TokenBucket, bitta chatga ~1 xabar/soniya
+notify_tasks = []
+
+def notify_admins(text, media=None):
+    # Moderatsiyani kutdirmaydi: navbat to'la bo'lsa ogohlantirish tashlab yuboriladi
+    for admin_id in ADMIN_IDS:
+        try:
+            notify_queue.put_nowait((admin_id, text, media))
+        except asyncio.QueueFull:
+            print(f"Ogohlantirishlar navbati to'la, admin {admin_id} uchun xabar tashlab yuborildi")
+
+# Reyd paytida bir xil ogohlantirishlar yig'iladi: birinchisi darhol, qolganlari oyna oxirida sanoq bilan
+alert_digests = {}  # (guruh, foydalanuvchi, taqiq) -> [takrorlar soni, oxirgi matn]
+
+def alert_admins(key, text, media=None):
+    window = alert_settings.get("digest_window", 60)
+    if window <= 0:
+        notify_admins(text, media)
+        return
+    digest = alert_digests.get(key)
+    if digest is not None:
+        digest[0] += 1
+        digest[1] = text
+        return
+    alert_digests[key] = [0, text]
+    notify_admins(text, media)
+    asyncio.get_running_loop().call_later(window, flush_alert_digest, key, window)
+
+def flush_alert_digest(key, window):
+    digest = alert_digests.get(key)
+    if digest is None:
+        return
+    repeats, text = digest
+    if not repeats:
+        del alert_digests[key]
+        return
+    notify_admins(f"Oxirgi {window} soniyada yana {repeats} marta takrorlandi. Oxirgisi:\n\n{text}")
+    # Hujum davom etsa, keyingi oynada ham faqat bitta xulosa yuboriladi
+    digest[0] = 0
+    asyncio.get_running_loop().call_later(window, flush_alert_digest, key, window)
+
+def get_chat_bucket(chat_id):
+    bucket = notify_chat_buckets.get(chat_id)
+    if bucket is None:
+        bucket = notify_chat_buckets[chat_id] = TokenBucket(1, 3)
+    return bucket
+
+async def call_with_retry(chat_id, make_call):
+    for attempt in range(NOTIFY_MAX_RETRIES + 1):
+        await notify_global_bucket.acquire()
+        await get_chat_bucket(chat_id).acquire()
+        try:
+            return await make_call()
+        except TelegramRetryAfter as e:
+            if attempt == NOTIFY_MAX_RETRIES:
+                raise
+            print(f"Telegram limiti: {e.retry_after} soniya kutiladi")
+            await asyncio.sleep(e.retry_after)
+
+async def deliver_notification(admin_id, text, media):
+    # Media fayl file_id orqali qayta yuboriladi, shuning uchun asl xabar o'chirilgan bo'lsa ham ishlaydi
+    caption = text
+    if media is None or len(text) > NOTIFY_CAPTION_LIMIT:
+        await call_with_retry(admin_id, lambda: bot.send_message(admin_id, text))
+        if media is None:
+            return
+        caption = None
+    kind, file_id = media
+    if kind == "audio":
+        await call_with_retry(admin_id, lambda: bot.send_audio(admin_id, file_id, caption=caption))
+    else:
+        await call_with_retry(admin_id, lambda: bot.send_document(admin_id, file_id, caption=caption))
+
+async def notify_worker():
+    while True:
+        admin_id, text, media = await notify_queue.get()
+        try:
+            await deliver_notification(admin_id, text, media)
+        except Exception as e:
+            print(f"Adminlarga xabar yuborishda xato: {e}")
+        finally:
+            notify_queue.task_done()
+
+def start_notify_workers():
+    if not notify_tasks:
+        for _ in range(NOTIFY_WORKERS):
+            notify_tasks.append(asyncio.create_task(notify_worker()))
+
+async def stop_notify_workers(timeout=5):
+    if not notify_tasks:
+        return
+    try:
+        await asyncio.wait_for(notify_queue.join(), timeout)
+    except asyncio.TimeoutError:
+        print(f"{notify_queue.qsize()} ta ogohlantirish yuborilmay qoldi")
+    for task in notify_tasks:
+        task.cancel()
+    notify_tasks.clear()
+
+dp.shutdown.register(stop_notify_workers)
+
+# Moderatsiya chaqiriqlari (cheklash, o'chirish) uchun umumiy tezlik chegarasi
+moderation_bucket = TokenBucket(20)
+
+async def call_api_with_retry(make_call, bucket=None):
+    for attempt in range(NOTIFY_MAX_RETRIES + 1):
+        await (bucket or moderation_bucket).acquire()
+        try:
+            return await make_call()
+        except TelegramRetryAfter as e:
+            if attempt == NOTIFY_MAX_RETRIES:
+                raise
+            print(f"Telegram limiti: {e.retry_after} soniya kutiladi")
+            await asyncio.sleep(e.retry_after)
+
+# O'chiriladigan xabarlar chat bo'yicha qisqa vaqt yig'iladi va deleteMessages bilan
+# bittada o'chiriladi; foydalanuvchilarga har bir xabar uchun emas, bitta xulosa yuboriladi
+DELETE_BATCH_DELAY = 0.3
+DELETE_BATCH_LIMIT = 100  # deleteMessages bir chaqiriqda ko'pi bilan 100 ta xabar
+pending_deletions = {}  # chat_id -> [xabar ID lari, {xabar turi: soni}]
+delete_tasks = set()
+
+def schedule_delete(chat_id, message_id, notice=None):
+    # notice - guruhga xabar qilinadigan tur (masalan "text"), None bo'lsa jim o'chiriladi
+    batch = pending_deletions.get(chat_id)
+    if batch is None:
+        batch = pending_deletions[chat_id] = [[], {}]
+        asyncio.get_running_loop().call_later(DELETE_BATCH_DELAY, flush_deletions, chat_id)
+    batch[0].append(message_id)
+    if notice:
+        batch[1][notice] = batch[1].get(notice, 0) + 1
+    if len(batch[0]) >= DELETE_BATCH_LIMIT:
+        flush_deletions(chat_id)
+
+def flush_deletions(chat_id):
+    batch = pending_deletions.pop(chat_id, None)
+    if batch is None:
+        return
+    task = asyncio.create_task(delete_batch(chat_id, *batch))
+    delete_tasks.add(task)
+    task.add_done_callback(delete_tasks.discard)
+
+async def delete_batch(chat_id, message_ids, notices):
+    for start in range(0, len(message_ids), DELETE_BATCH_LIMIT):
+        chunk = message_ids[start:start + DELETE_BATCH_LIMIT]
+        try:
+            await call_api_with_retry(lambda: bot.delete_messages(chat_id, chunk))
+            print(f"{len(chunk)} ta xabar o'chirildi (guruh {chat_id})")
+        except Exception as e:
+            print(f"Xabarlarni o'chirishda xato (guruh {chat_id}, {len(chunk)} ta): {e}")
+    if not notices:
+        return
+    total = sum(notices.values())
+    if total == 1:
+        msg_type = next(iter(notices))
+        text = f"{msg_type.capitalize()} yuborish taqiqlangan! Xabar o'chirildi."
+    else:
+        details = ", ".join(f"{msg_type}: {count}" for msg_type, count in notices.items())
+        text = f"{total} ta taqiqlangan xabar o'chirildi ({details})."
+    try:
+        await call_api_with_retry(lambda: bot.send_message(chat_id, text))
+    except Exception as e:
+        print(f"O'chirish haqida xabar yuborishda xato: {e}")
+
+async def stop_delete_scheduler():
+    for chat_id in list(pending_deletions):
+        flush_deletions(chat_id)
+    if delete_tasks:
+        await asyncio.gather(*delete_tasks, return_exceptions=True)
+
+dp.shutdown.register(stop_delete_scheduler)
+
+# Botning o'zi va guruhlardagi adminlik holati uchun kesh
+BOT_ME_TTL = 3600
+ADMIN_STATUS_TTL = 600
+NOT_ADMIN_TTL = 60
+bot_me = None
+bot_me_expires = 0
+admin_status_cache = {}  # chat_id -> (is_admin, expires_at)
+admin_status_pending = {}  # chat_id -> asyncio.Task
+
+async def get_bot_me():
+    global bot_me, bot_me_expires
+    now = time.monotonic()
+    if bot_me is None or now >= bot_me_expires:
+        bot_me = await bot.get_me()
+        bot_me_expires = now + BOT_ME_TTL
+    return bot_me
+
+def set_admin_status(chat_id, is_admin):
+    ttl = ADMIN_STATUS_TTL if is_admin else NOT_ADMIN_TTL
+    admin_status_cache[chat_id] = (is_admin, time.monotonic() + ttl)
+
+async def fetch_admin_status(chat_id):
+    me = await get_bot_me()
+    try:
+        chat_member = await bot.get_chat_member(chat_id, me.id)
+        is_admin = chat_member.status in ("administrator", "creator")
+    except (TelegramBadRequest, TelegramForbiddenError) as e:
+        # Bot guruhda yo'q yoki huquqi yo'q - bu haqiqiy "admin emas" javobi
+        print(f"Adminlik tekshirishda xato: {e}")
+        is_admin = False
+    except Exception as e:
+        # Tarmoq xatosi, 5xx yoki RetryAfter keshlanmaydi: oldingi qiymat ishlatiladi,
+        # keyingi xabarda esa qayta so'raladi
+        print(f"Adminlik tekshirishda vaqtinchalik xato: {e}")
+        cached = admin_status_cache.get(chat_id)
+        return cached[0] if cached else False
+    set_admin_status(chat_id, is_admin)
+    return is_admin
+
+async def is_bot_admin(chat_id):
+    cached = admin_status_cache.get(chat_id)
+    if cached and time.monotonic() < cached[1]:
+        return cached[0]
+    # Bir guruhdan bir vaqtda kelgan xabarlar bitta so'rovni kutadi
+    task = admin_status_pending.get(chat_id)
+    if task is None:
+        task = asyncio.create_task(fetch_admin_status(chat_id))
+        admin_status_pending[chat_id] = task
+        task.add_done_callback(lambda t: admin_status_pending.pop(chat_id, None))
+    return await task
+
+@router.my_chat_member()
+async def on_my_chat_member(event: types.ChatMemberUpdated):
+    # Telegram botning huquqlari o'zgarganini o'zi xabar qiladi
+    is_admin = event.new_chat_member.status in ("administrator", "creator")
+    set_admin_status(event.chat.id, is_admin)
+    await db.run(save_admin_statuses, [(int(is_admin), time.time(), event.chat.id)])
+
+# Barcha guruhlardagi adminlik holati fonda davriy tekshiriladi va groups jadvalida saqlanadi,
+# "Guruhlar soni" paneli esa shu tayyor natijadan darhol javob beradi
+ADMIN_SCAN_INTERVAL = 3600
+ADMIN_SCAN_START_DELAY = 60
+ADMIN_SCAN_CONCURRENCY = 8
+ADMIN_SCAN_BATCH = 100
+admin_scan_bucket = TokenBucket(10)
+admin_scan_lock = asyncio.Lock()
+admin_scan_task = None
+
+async def run_admin_scan():
+    if admin_scan_lock.locked():
+        return False
+    async with admin_scan_lock:
+        started = time.monotonic()
+        groups = await db.run(get_all_groups)
+        me = await get_bot_me()
+        chat_ids = iter([group[2] for group in groups])
+        pending = []
+        checked = 0
+
+        async def scan_worker():
+            nonlocal checked
+            for chat_id in chat_ids:
+                try:
+                    member = await call_api_with_retry(lambda: bot.get_chat_member(chat_id, me.id), admin_scan_bucket)
+                    is_admin = member.status in ("administrator", "creator")
+                except (TelegramBadRequest, TelegramForbiddenError):
+                    # Bot guruhdan chiqarilgan yoki guruh o'chirilgan
+                    is_admin = False
+                except Exception as e:
+                    print(f"Guruh {chat_id} tekshirishda xato: {e}")
+                    continue
+                set_admin_status(chat_id, is_admin)
+                pending.append((int(is_admin), time.time(), chat_id))
+                checked += 1
+                if len(pending) >= ADMIN_SCAN_BATCH:
+                    batch = pending[:]
+                    pending.clear()
+                    await db.run(save_admin_statuses, batch)
+
+        await asyncio.gather(*(scan_worker() for _ in range(ADMIN_SCAN_CONCURRENCY)))
+        if pending:
+            await db.run(save_admin_statuses, pending)
+        print(f"Adminlik holati tekshirildi: {checked}/{len(groups)} ta guruh, {time.monotonic() - started:.1f} s")
+        return True
+
+async def admin_scan_loop():
+    request_priority.set(LOW)
+    await asyncio.sleep(ADMIN_SCAN_START_DELAY)
+    while True:
+        try:
+            await run_admin_scan()
+        except Exception as e:
+            print(f"Adminlik holatini tekshirishda xato: {e}")
+        await asyncio.sleep(ADMIN_SCAN_INTERVAL)
+
+async def start_admin_scanner():
+    global admin_scan_task
+    # Ko'p jarayonli rejimda faqat birinchi ishchi tekshiradi
+    if worker_index not in (None, 0) or admin_scan_task is not None:
+        return
+    admin_scan_task = asyncio.create_task(admin_scan_loop())
+
+async def stop_admin_scanner():
+    global admin_scan_task
+    if admin_scan_task is not None:
+        admin_scan_task.cancel()
+        admin_scan_task = None
+
+dp.startup.register(start_admin_scanner)
+dp.shutdown.register(stop_admin_scanner)
+
+def format_age(seconds):
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds} soniya"
+    if seconds < 3600:
+        return f"{seconds // 60} daqiqa"
+    if seconds < 86400:
+        return f"{seconds // 3600} soat"
+    return f"{seconds // 86400} kun"
+
+async def group_count_text():
+    total, admins, checked_at, unchecked = await db.run(get_admin_snapshot)
+    lines = [f"Jami guruhlar: {total}", f"Adminlik berilgan guruhlar: {admins}"]
+    if checked_at:
+        lines.append(f"Ma'lumot {format_age(time.time() - checked_at)} oldin yangilangan")
+    else:
+        lines.append("Adminlik holati hali tekshirilmagan")
+    if checked_at and unchecked:
+        lines.append(f"Tekshirilmagan guruhlar: {unchecked}")
+    if admin_scan_lock.locked():
+        lines.append("Yangilanmoqda...")
+    return "\n".join(lines)
+
+def group_count_keyboard():
+    return types.InlineKeyboardMarkup(inline_keyboard=[
+        [types.InlineKeyboardButton(text="Yangilash", callback_data="group_count_refresh")],
+        [types.InlineKeyboardButton(text="Orqaga", callback_data="back_admin")]
+    ])
+
+# Reyd himoyasi: lockdown holati, cheklovlar parallel va tezlik chegarasi bilan bajariladi
+RAID_RESTRICT_CONCURRENCY = 8
+RAID_MAX_JOINERS = 100000
+lockdown_until = {}  # chat_id -> lockdown tugash vaqti (monotonic)
+lockdown_joiners = OrderedDict()  # (chat_id, user_id) -> lockdown paytida qo'shilgan vaqti
+pending_welcomes = {}  # chat_id -> [yangi a'zolar soni]
+raid_tasks = set()
+restrict_semaphore = asyncio.Semaphore(RAID_RESTRICT_CONCURRENCY)
+
+def is_locked_down(chat_id):
+    until = lockdown_until.get(chat_id)
+    if until is None:
+        return False
+    if until <= time.monotonic():
+        del lockdown_until[chat_id]
+        return False
+    return True
+
+def record_joins(chat_id, count):
+    # (lockdown yoqilganmi, shu qo'shilish bilan boshlandimi) qaytaradi
+    if not raid_settings.get("enabled") or not count:
+        return is_locked_down(chat_id), False
+    now = time.monotonic()
+    started = False
+    for _ in range(count):
+        flooding, _ = join_rate.hit(chat_id, now)
+        if flooding:
+            started = started or not is_locked_down(chat_id)
+            lockdown_until[chat_id] = now + raid_settings["lockdown_duration"]
+    return is_locked_down(chat_id), started
+
+def remember_lockdown_joiners(chat_id, user_ids):
+    now = time.monotonic()
+    for user_id in user_ids:
+        lockdown_joiners[(chat_id, user_id)] = now
+        lockdown_joiners.move_to_end((chat_id, user_id))
+    while len(lockdown_joiners) > RAID_MAX_JOINERS:
+        lockdown_joiners.popitem(last=False)
+
+async def restrict_member(chat_id, user_id, until_date):
+    async with restrict_semaphore:
+        await call_api_with_retry(lambda: bot.restrict_chat_member(
+            chat_id,
+            user_id,
+            permissions=types.ChatPermissions(can_send_messages=False),
+            until_date=until_date
+        ))
+
+async def restrict_members(chat_id, user_ids, duration):
+    until_date = int(time.time()) + duration
+    results = await asyncio.gather(
+        *(restrict_member(chat_id, user_id, until_date) for user_id in user_ids),
+        return_exceptions=True
     )
-    conn.commit()
+    failed = 0
+    for user_id, result in zip(user_ids, results):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"Mute qilishda xato (user {user_id}): {result}")
+    print(f"{len(user_ids) - failed} ta yangi a'zo {duration} sekundga mute qilindi (guruh {chat_id}).")
+
+def queue_welcome(chat_id, count, text):
+    # Lockdown paytida har bir qo'shilishga javob o'rniga bitta umumiy welcome
+    pending = pending_welcomes.get(chat_id)
+    if pending is not None:
+        pending[0] += count
+        return
+    pending_welcomes[chat_id] = [count]
+    task = asyncio.create_task(send_aggregated_welcome(chat_id, text))
+    raid_tasks.add(task)
+    task.add_done_callback(raid_tasks.discard)
+
+async def send_aggregated_welcome(chat_id, text):
+    await asyncio.sleep(raid_settings.get("welcome_delay", 30))
+    count = pending_welcomes.pop(chat_id, [0])[0]
+    try:
+        await bot.send_message(chat_id, f"{text}\n\n({count} ta yangi a'zo)")
+    except Exception as e:
+        print(f"Umumiy welcome yuborishda xato: {e}")
+
+async def check_raid_autoban(message):
+    # Lockdown paytida qo'shilib, darhol yozgan akkaunt ban qilinadi
+    key = (message.chat.id, message.from_user.id)
+    joined = lockdown_joiners.pop(key, None)
+    if joined is None or time.monotonic() - joined > raid_settings.get("autoban_seconds", 0):
+        return False
+    schedule_delete(message.chat.id, message.message_id)
+    try:
+        await call_api_with_retry(lambda: bot.ban_chat_member(*key))
+    except Exception as e:
+        print(f"Reyd akkauntini ban qilishda xato: {e}")
+    await log_banned_event(key[0], key[1], "raid_ban", "raid", message.text or message.caption or "")
+    return True
 
 @router.message(F.new_chat_members)
 async def on_new_member_join(message: types.Message):
+    # Har bir yangilanish alohida vazifada ishlaydi, ustuvorlik faqat shu vazifaga ta'sir qiladi
+    request_priority.set(HIGH)
+    me = await get_bot_me()
     if message.chat.type in ("group", "supergroup"):
-        me = await bot.get_me()
-        try:
-            chat_member = await bot.get_chat_member(message.chat.id, me.id)
-            if chat_member.status not in ("administrator", "creator"):
-                return
-        except Exception:
+        if not await is_bot_admin(message.chat.id):
             return
+        _, welcome = get_group_settings(message.chat.id)
+        chat_id = message.chat.id
+        members = [member.id for member in message.new_chat_members if member.id != me.id]  # Bot o'zini mute qilmasin
+        locked, started = record_joins(chat_id, len(members))
+
+        if locked:
+            if started:
+                group_name = message.chat.title or "Noma'lum guruh"
+                print(f"Guruh {chat_id} lockdown rejimiga o'tdi.")
+                alert_admins(
+                    (chat_id, "raid"),
+                    f"Guruhda reyd aniqlandi, lockdown yoqildi!\nGuruh nomi: {group_name}\nGuruh ID: {chat_id}\n{raid_settings['join_window']} soniyada {raid_settings['join_limit']} tadan ko'p yangi a'zo"
+                )
+            if members:
+                if raid_settings.get("autoban_seconds"):
+                    remember_lockdown_joiners(chat_id, members)
+                if welcome["enabled"]:
+                    queue_welcome(chat_id, len(members), welcome["message"])
+                await restrict_members(chat_id, members, raid_settings["mute_duration"])
+        else:
+            if welcome["enabled"]:
+                welcome_msg = welcome["message"]
+                await message.reply(welcome_msg)
 
-        if welcome_settings["enabled"]:
-            welcome_msg = welcome_settings["message"]
-            await message.reply(welcome_msg)
-
-        if welcome_settings["mute_enabled"]:
-            for member in message.new_chat_members:
-                if member.id != me.id:  # Bot o'zini mute qilmasin
-                    try:
-                        current_time = int(time.time())
-                        until_date = current_time + welcome_settings["mute_duration"]
-                        print(f"Mute qilinmoqda: user {member.id} gacha {until_date} (hozir {current_time}), duration: {welcome_settings['mute_duration']}")
-                        await bot.restrict_chat_member(
-                            message.chat.id,
-                            member.id,
-                            permissions=types.ChatPermissions(can_send_messages=False),
-                            until_date=until_date
-                        )
-                        print(f"Yangi a'zo {member.id} {welcome_settings['mute_duration']} sekundga mute qilindi. Until: {until_date}")
-                    except Exception as e:
-                        print(f"Mute qilishda xato: {e}")
+            if welcome["mute_enabled"] and members:
+                await restrict_members(chat_id, members, welcome["mute_duration"])
 
     for member in message.new_chat_members:
-        if member.id == (await bot.get_me()).id:
+        if member.id == me.id:
             group_name = message.chat.title or "Noma'lum guruh"
-            group_id = add_group(conn, group_name, message.chat.id)
+            group_id = await db.run(add_group, group_name, message.chat.id)
+            # Bot qayta qo'shilganda ham vaqt yangilanadi va bazaga yoziladi
+            await set_joined_time(message.chat.id, message.date.timestamp())
             if group_id:
-                joined_times[message.chat.id] = message.date.timestamp()
                 await message.reply(f"Men guruhga qo'shildim! Guruh tartib raqami: {group_id}")
             else:
                 await message.reply("Men allaqachon ushbu guruhda!")
@@ -262,7 +1119,7 @@ async def send_welcome(message: types.Message):
             print(f"Admin panel da xato: {e}")
     else:
         if message.chat.type == "private":
-            bot_info = await bot.get_me()
+            bot_info = await get_bot_me()
             add_to_group_url = f"https://t.me/{bot_info.username}?startgroup=true"
             keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
                 [types.InlineKeyboardButton(text="Guruhga qo'shish", url=add_to_group_url)],
@@ -274,10 +1131,8 @@ async def send_welcome(message: types.Message):
                 reply_markup=keyboard
             )
         elif message.chat.type in ("group", "supergroup"):
-            me = await bot.get_me()
             try:
-                chat_member = await bot.get_chat_member(message.chat.id, me.id)
-                if chat_member.status not in ("administrator", "creator"):
+                if not await is_bot_admin(message.chat.id):
                     await message.reply("Iltimos, meni guruhda admin qiling!")
                 else:
                     await message.reply("Ushbu bot ish faoliyatida!")
@@ -285,27 +1140,20 @@ async def send_welcome(message: types.Message):
                 await message.reply(f"Xatolik yuz berdi: {str(e)}")
                 print(f"/start da xato: {e}")
 
-@router.message(Command("stats"))
-async def stats_command(message: types.Message):
-    if message.from_user.id not in ADMIN_IDS:
-        await message.reply("Faqat adminlar uchun!")
-        return
+# Statistika yig'ma jadvallardan olinadi va qisqa muddat keshlanadi
+STATS_CACHE_TTL = 30
+stats_cache = {}  # soatlar -> (expires_at, matn)
 
-    cursor = conn.cursor()
-    # Oxirgi 24 soat
-    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute("SELECT COUNT(*) FROM logs WHERE timestamp > ?", (yesterday,))
-    total_today = cursor.fetchone()[0]
+async def get_stats_text(hours=24):
+    now = time.monotonic()
+    cached = stats_cache.get(hours)
+    if cached and now < cached[0]:
+        return cached[1]
+    since_hour = time.strftime("%Y-%m-%d %H:00:00", time.gmtime(time.time() - (hours - 1) * 3600))
+    total, type_stats, top_banned = await db.run(get_stats, since_hour)
 
-    # Turlarga ko'ra
-    cursor.execute("SELECT type, COUNT(*) FROM logs WHERE timestamp > ? GROUP BY type", (yesterday,))
-    type_stats = cursor.fetchall()
-
-    # Eng ko'p taqiqlangan item
-    cursor.execute("SELECT banned_item, COUNT(*) FROM logs WHERE timestamp > ? GROUP BY banned_item ORDER BY COUNT(*) DESC LIMIT 5", (yesterday,))
-    top_banned = cursor.fetchall()
-
-    stats_text = f"Statistika (oxirgi 24 soat):\nJami taqiqlangan: {total_today}\n\nTurlarga ko'ra:\n"
+    period = f"oxirgi {hours} soat" if hours <= 24 else f"oxirgi {hours // 24} kun"
+    stats_text = f"Statistika ({period}):\nJami taqiqlangan: {total}\n\nTurlarga ko'ra:\n"
     for t, count in type_stats:
         stats_text += f"{t.capitalize()}: {count}\n"
 
@@ -313,36 +1161,22 @@ async def stats_command(message: types.Message):
     for item, count in top_banned:
         stats_text += f"{item}: {count}\n"
 
-    await message.reply(stats_text)
+    stats_cache[hours] = (now + STATS_CACHE_TTL, stats_text)
+    return stats_text
+
+@router.message(Command("stats"))
+async def stats_command(message: types.Message):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.reply("Faqat adminlar uchun!")
+        return
+    await message.reply(await get_stats_text(24))
 
 @router.callback_query(F.data == "stats_cb")
 async def stats_callback(callback: types.CallbackQuery):
     if callback.from_user.id not in ADMIN_IDS:
         await callback.answer("Faqat adminlar uchun!", show_alert=True)
         return
-    # stats_command ni takrorlash
-    cursor = conn.cursor()
-    # Oxirgi 24 soat
-    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute("SELECT COUNT(*) FROM logs WHERE timestamp > ?", (yesterday,))
-    total_today = cursor.fetchone()[0]
-
-    # Turlarga ko'ra
-    cursor.execute("SELECT type, COUNT(*) FROM logs WHERE timestamp > ? GROUP BY type", (yesterday,))
-    type_stats = cursor.fetchall()
-
-    # Eng ko'p taqiqlangan item
-    cursor.execute("SELECT banned_item, COUNT(*) FROM logs WHERE timestamp > ? GROUP BY banned_item ORDER BY COUNT(*) DESC LIMIT 5", (yesterday,))
-    top_banned = cursor.fetchall()
-
-    stats_text = f"Statistika (oxirgi 24 soat):\nJami taqiqlangan: {total_today}\n\nTurlarga ko'ra:\n"
-    for t, count in type_stats:
-        stats_text += f"{t.capitalize()}: {count}\n"
-
-    stats_text += "\nEng ko'p taqiqlanganlar:\n"
-    for item, count in top_banned:
-        stats_text += f"{item}: {count}\n"
-
+    stats_text = await get_stats_text(24)
     keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
         [types.InlineKeyboardButton(text="Orqaga", callback_data="back_admin")]
     ])
@@ -406,7 +1240,7 @@ async def add_word(message: types.Message, state: FSMContext):
     if message.from_user.id not in ADMIN_IDS:
         await state.clear()
         return
-    update_banned_list("taqiq.xlsx", new_item=message.text.strip().lower())
+    await add_banned_item("word", message.text.strip().lower())
     await message.reply(f"Taqiqlangan so'z qo'shildi: {message.text}")
     await state.clear()
 
@@ -415,7 +1249,7 @@ async def del_word(message: types.Message, state: FSMContext):
     if message.from_user.id not in ADMIN_IDS:
         await state.clear()
         return
-    update_banned_list("taqiq.xlsx", remove_item=message.text.strip().lower())
+    await remove_banned_item("word", message.text.strip().lower())
     await message.reply(f"Taqiqlangan so'z o'chirildi: {message.text}")
     await state.clear()
 
@@ -424,7 +1258,7 @@ async def add_audio(message: types.Message, state: FSMContext):
     if message.from_user.id not in ADMIN_IDS:
         await state.clear()
         return
-    update_banned_list("taqiq_audio.xlsx", new_item=message.text.strip().lower())
+    await add_banned_item("audio", message.text.strip().lower())
     await message.reply(f"Taqiqlangan audio nomi qo'shildi: {message.text}")
     await state.clear()
 
@@ -433,7 +1267,7 @@ async def del_audio(message: types.Message, state: FSMContext):
     if message.from_user.id not in ADMIN_IDS:
         await state.clear()
         return
-    update_banned_list("taqiq_audio.xlsx", remove_item=message.text.strip().lower())
+    await remove_banned_item("audio", message.text.strip().lower())
     await message.reply(f"Taqiqlangan audio nomi o'chirildi: {message.text}")
     await state.clear()
 
@@ -442,7 +1276,7 @@ async def add_file(message: types.Message, state: FSMContext):
     if message.from_user.id not in ADMIN_IDS:
         await state.clear()
         return
-    update_banned_list("all.xlsx", new_item=message.text.strip().lower())
+    await add_banned_item("file", message.text.strip().lower())
     await message.reply(f"Taqiqlangan fayl nomi qo'shildi: {message.text}")
     await state.clear()
 
@@ -451,7 +1285,7 @@ async def del_file(message: types.Message, state: FSMContext):
     if message.from_user.id not in ADMIN_IDS:
         await state.clear()
         return
-    update_banned_list("all.xlsx", remove_item=message.text.strip().lower())
+    await remove_banned_item("file", message.text.strip().lower())
     await message.reply(f"Taqiqlangan fayl nomi o'chirildi: {message.text}")
     await state.clear()
 
@@ -463,7 +1297,7 @@ async def help_callback(callback: types.CallbackQuery):
     try:
         await callback.message.edit_text(
             "Bot taqiqlangan so'zlar, audio va fayllarni guruhda tekshiradi.\n"
-            "Buyruqlar:\n/start - Boshlash\n/update_lists - Ro'yxatni yangilash\n/admin - Admin panel\n/stats - Statistika\n/groups - Guruhlar ro'yxati",
+            "Buyruqlar:\n/start - Boshlash\n/update_lists - Ro'yxatlarni Excel fayllardan import qilish\n/export_lists - Ro'yxatlarni Excel faylga eksport qilish\n/admin - Admin panel\n/stats - Statistika\n/groups - Guruhlar ro'yxati\n/setting - Guruh sozlamalari (guruh ichida)\n/ban_media, /unban_media - Media bloklash (xabarga javob sifatida)",
             reply_markup=keyboard
         )
         await callback.answer()
@@ -507,7 +1341,7 @@ async def back_callback(callback: types.CallbackQuery):
             await callback.answer(f"Xatolik: {str(e)}", show_alert=True)
             print(f"Back admin da xato: {e}")
     else:
-        bot_info = await bot.get_me()
+        bot_info = await get_bot_me()
         add_to_group_url = f"https://t.me/{bot_info.username}?startgroup=true"
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
             [types.InlineKeyboardButton(text="Guruhga qo'shish", url=add_to_group_url)],
@@ -524,180 +1358,450 @@ async def back_callback(callback: types.CallbackQuery):
             await callback.answer(f"Xatolik: {str(e)}", show_alert=True)
             print(f"Back callback da xato: {e}")
 
-@router.message(F.text | F.audio | F.document | F.video | F.animation | F.voice | F.photo | F.sticker | F.poll)
-async def check_messages(message: types.Message):
-    if message.chat.type in ("group", "supergroup"):
-        me = await bot.get_me()
+async def handle_flood(message, first):
+    # Xabar o'chirilgan bo'lsa True qaytaradi: faqat shunda qolgan tekshiruvlar o'tkazib yuboriladi
+    settings = flood_settings
+    actions = settings.get("actions", [])
+    group_id = message.chat.id
+    user_id = message.from_user.id
+    deleted = "delete" in actions
+    if deleted:
+        schedule_delete(group_id, message.message_id)
+    if not first:
+        return deleted
+    await log_banned_event(group_id, user_id, "flood", "flood", message.text or message.caption or "")
+    if "mute" in actions:
         try:
-            chat_member = await bot.get_chat_member(message.chat.id, me.id)
-            if chat_member.status not in ("administrator", "creator"):
-                return
+            await restrict_member(group_id, user_id, int(time.time()) + settings.get("mute_duration", 300))
         except Exception as e:
-            print(f"Adminlik tekshirishda xato: {e}")
-            return
+            print(f"Flood uchun mute qilishda xato: {e}")
+    if "alert" in actions:
+        group_name = message.chat.title or "Noma'lum guruh"
+        username = f"@{message.from_user.username}" if message.from_user.username else "N/A"
+        alert_admins(
+            (group_id, user_id, "flood"),
+            f"Guruhda flood aniqlandi!\nGuruh nomi: {group_name}\nGuruh ID: {group_id}\nFoydalanuvchi ID: {user_id}\nUsername: {username}\n{settings.get('window')} soniyada {settings.get('limit')} tadan ko'p xabar"
+        )
+    return deleted
 
-        # Admin emasligini tekshirish
-        if message.from_user.id in ADMIN_IDS:
-            return  # Adminlar taqiqlanmaydi
+def content_key(file_unique_id, text):
+    # Media uchun file_unique_id, matn uchun normallashtirilgan ko'rinish xeshi.
+    # hash() jarayonlar orasida tuzli, shuning uchun barqaror blake2b ishlatiladi
+    if file_unique_id is not None:
+        data = "media:" + file_unique_id
+    else:
+        if not text:
+            return None
+        text = normalize(text)
+        if len(text) < duplicate_settings.get("min_text_length", 30):
+            return None
+        data = "text:" + text
+    return hashlib.blake2b(data.encode(), digest_size=8).digest()
+
+def duplicate_key(message):
+    media = message.photo[-1] if message.photo else (
+        message.video or message.animation or message.document or message.audio or message.voice
+    )
+    return content_key(media.file_unique_id if media is not None else None, message.text or message.caption)
 
+def raw_duplicate_key(message):
+    # Ko'p jarayonli rejimda asosiy jarayon xom JSON dan xuddi shu kalitni oladi
+    photos = message.get("photo")
+    media = photos[-1] if photos else (
+        message.get("video") or message.get("animation") or message.get("document") or message.get("audio") or message.get("voice")
+    )
+    return content_key(media["file_unique_id"] if media else None, message.get("text") or message.get("caption"))
+
+# Ishchida asosiy jarayon hisoblagan natija (belgilangan, birinchi marta)
+shard_duplicate = contextvars.ContextVar("shard_duplicate", default=None)
+
+def check_duplicate(message):
+    if worker_index is not None:
+        # Guruhlar ishchilarga bo'lingan: guruhlararo hisob faqat asosiy jarayonda to'liq
+        return shard_duplicate.get() or (False, False)
+    key = duplicate_key(message)
+    if key is None:
+        return False, False
+    return duplicate_detector.hit(key, message.chat.id)
+
+async def handle_duplicate(message, first):
+    # Belgilangan spam nusxasi qolgan tekshiruvlarsiz o'chiriladi
+    group_id = message.chat.id
+    user_id = message.from_user.id
+    details = message.text or message.caption or ""
+    schedule_delete(group_id, message.message_id)
+    await log_banned_event(group_id, user_id, "duplicate", "duplicate", details)
+    if first:
         group_name = message.chat.title or "Noma'lum guruh"
-        group_id = message.chat.id
-        group_username = f"@{message.chat.username}" if message.chat.username else "N/A"
-        user_id = message.from_user.id
         username = f"@{message.from_user.username}" if message.from_user.username else "N/A"
-        joined_time = joined_times.get(message.chat.id, 0)
-        is_after_join = message.date.timestamp() > joined_time
-        # Vaqtni UTC+05:00 (Toshkent) ga moslash
-        tz = pytz.timezone("Asia/Tashkent")
-        message_time = message.date.astimezone(tz).strftime("%Y-%m-%d %H:%M:%S %Z")
-
-        action = "allow"  # Default
-        msg_type = "text"
-
-        # Taqiqlangan so'zlar tekshiruvi (text uchun)
-        if message.text:
-            text_lower = message.text.lower()
-            words = text_lower.split()
-            for word in BANNED_WORDS:
-                if word in words:
-                    log_banned_event(group_id, user_id, "text", word, message.text)
-                    for admin_id in ADMIN_IDS:
-                        try:
-                            await bot.send_message(
-                                admin_id,
-                                f"Guruhda taqiqlangan so‘z aniqlandi!\nGuruh nomi: {group_name}\nGuruh ID: {group_id}\nGuruh username: {group_username}\nFoydalanuvchi ID: {user_id}\nUsername: {username}\nSo‘z: {word}\nXabar: {message.text}\nVaqt: {message_time}"
-                            )
-                            await bot.forward_message(admin_id, message.chat.id, message.message_id)
-                        except Exception as e:
-                            print(f"Adminlarga xabar yuborishda xato: {e}")
-                    action = delete_settings.get("text", "allow")
-                    msg_type = "text"
-                    break
+        alert_admins(
+            ("duplicate", user_id),
+            f"Spam to'lqini aniqlandi (bir xil kontent {duplicate_settings.get('threshold')} ta guruhda)!\nGuruh nomi: {group_name}\nGuruh ID: {group_id}\nFoydalanuvchi ID: {user_id}\nUsername: {username}\nXabar: {details[:200]}"
+        )
 
-            # Link tekshiruvi
-            if action == "allow" and any(entity.type == "url" for entity in (message.entities or [])):
-                log_banned_event(group_id, user_id, "link", "URL", message.text)
-                for admin_id in ADMIN_IDS:
-                    try:
-                        await bot.send_message(
-                            admin_id,
-                            f"Guruhda taqiqlangan link aniqlandi!\nGuruh nomi: {group_name}\nGuruh ID: {group_id}\nGuruh username: {group_username}\nFoydalanuvchi ID: {user_id}\nUsername: {username}\nXabar: {message.text}\nVaqt: {message_time}"
-                        )
-                        await bot.forward_message(admin_id, message.chat.id, message.message_id)
-                    except Exception as e:
-                        print(f"Adminlarga link xabar yuborishda xato: {e}")
-                action = delete_settings.get("link", "allow")
-                msg_type = "link"
-
-        # Boshqa turlar
-        elif message.photo:
-            action = delete_settings.get("photo", "allow")
-            msg_type = "photo"
-        elif message.video:
-            action = delete_settings.get("video", "allow")
-            msg_type = "video"
-        elif message.sticker:
-            action = delete_settings.get("sticker", "allow")
-            msg_type = "sticker"
-        elif message.voice:
-            action = delete_settings.get("voice", "allow")
-            msg_type = "voice"
-        elif message.audio:
-            action = delete_settings.get("audio", "allow")
-            msg_type = "audio"
-            # Audio nomini tekshirish (musiqa uchun)
-            if message.audio.title:
-                base_name = message.audio.title.lower().strip()
-                base_words = base_name.split()
-                for banned in BANNED_AUDIO_NAMES:
-                    if banned in base_words:
-                        log_banned_event(group_id, user_id, "audio", banned, message.audio.title)
-                        for admin_id in ADMIN_IDS:
-                            try:
-                                await bot.send_message(
-                                    admin_id,
-                                    f"Guruhda taqiqlangan audio aniqlandi!\nGuruh nomi: {group_name}\nGuruh ID: {group_id}\nGuruh username: {group_username}\nFoydalanuvchi ID: {user_id}\nUsername: {username}\nAudio: {message.audio.title}\nTaqiqlangan: {banned}\nVaqt: {message_time}"
-                                )
-                                await bot.forward_message(admin_id, message.chat.id, message.message_id)
-                            except Exception as e:
-                                print(f"Adminlarga audio yuborishda xato: {e}")
-                        action = delete_settings.get("audio", "allow")
-                        break
-        elif message.document:
-            file_name = message.document.file_name or "Noma'lum fayl"
-            base_name = os.path.splitext(file_name)[0].lower().strip()
-            base_words = base_name.split()
-            for banned in BANNED_FILE_NAMES:
-                if banned in base_words:
-                    log_banned_event(group_id, user_id, "document", banned, file_name)
-                    for admin_id in ADMIN_IDS:
-                        try:
-                            await bot.send_message(
-                                admin_id,
-                                f"Guruhda taqiqlangan fayl aniqlandi!\nGuruh nomi: {group_name}\nGuruh ID: {group_id}\nGuruh username: {group_username}\nFoydalanuvchi ID: {user_id}\nUsername: {username}\nFayl: {file_name}\nTaqiqlangan: {banned}\nVaqt: {message_time}"
-                            )
-                            await bot.forward_message(admin_id, message.chat.id, message.message_id)
-                        except Exception as e:
-                            print(f"Adminlarga fayl yuborishda xato: {e}")
-                    action = delete_settings.get("document", "allow")
-                    break
-            else:
-                action = delete_settings.get("file", "allow")
-            msg_type = "document"
-        elif message.poll:
-            action = delete_settings.get("poll", "allow")
-            msg_type = "poll"
+async def change_banned_media(message, ban):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.reply("Faqat adminlar uchun!")
+        return
+    target = message.reply_to_message
+    keys = media_keys(target) if target else []
+    if not keys:
+        await message.reply("Rasm, stiker, video yoki ovozli xabarga javob (reply) sifatida yuboring. Botga forward qilingan xabarga ham javob berish mumkin.\nStiker to'plami uchun: /ban_media set")
+        return
+    args = (message.text or "").split()
+    if len(args) > 1 and args[1].lower() == "set":
+        keys = [key for key in keys if key[0] == "set"]
+        if not keys:
+            await message.reply("Bu stiker hech qaysi to'plamga tegishli emas.")
+            return
+    else:
+        keys = keys[:1]
+    kind, value = keys[0]
+    if ban:
+        changed = await add_banned_media(kind, value, message.from_user.id)
+        text = "Media bloklandi" if changed else "Media allaqachon bloklangan"
+    else:
+        changed = await remove_banned_media(kind, value)
+        text = "Media blokdan chiqarildi" if changed else "Bu media bloklanmagan"
+    label = "stiker to'plami" if kind == "set" else "fayl"
+    await message.reply(f"{text}: {label} {value}")
+
+def media_command_allowed(message):
+    # Guruhda bot adminlaridan boshqalarning buyrug'i oddiy xabar sifatida moderatsiyadan o'tadi
+    return message.chat.type == "private" or message.from_user.id in ADMIN_IDS
+
+@router.message(Command("ban_media"), media_command_allowed)
+async def ban_media(message: types.Message):
+    await change_banned_media(message, True)
+
+@router.message(Command("unban_media"), media_command_allowed)
+async def unban_media(message: types.Message):
+    await change_banned_media(message, False)
+
+SETTING_ACTIONS = ("delete", "warn", "allow")
+SETTING_SWITCHES = {"welcome": "enabled", "mute": "mute_enabled"}
+
+def format_group_settings(chat_id):
+    settings, welcome = get_group_settings(chat_id)
+    overrides = group_overrides.get(chat_id, {})
+    changed = {**overrides.get("delete_settings", {}), **overrides.get("welcome_settings", {})}
+    lines = ["Guruh sozlamalari (* - guruh uchun o'zgartirilgan):"]
+    for key, value in settings.items():
+        lines.append(f"{key}: {value}{' *' if key in changed else ''}")
+    lines.append(f"welcome: {'on' if welcome['enabled'] else 'off'}{' *' if 'enabled' in changed else ''}")
+    lines.append(f"mute: {'on' if welcome['mute_enabled'] else 'off'}{' *' if 'mute_enabled' in changed else ''}")
+    lines.append(f"mute_duration: {welcome['mute_duration']}{' *' if 'mute_duration' in changed else ''}")
+    lines.append(f"welcome_message: {welcome['message'][:50]}{' *' if 'message' in changed else ''}")
+    return "\n".join(lines)
+
+SETTING_USAGE = (
+    "Foydalanish:\n/setting - joriy sozlamalar\n"
+    "/setting <tur> delete|warn|allow|default (tur: text, link, audio, photo, video, sticker, voice, document, file, poll)\n"
+    "/setting welcome on|off|default\n/setting mute on|off|default\n"
+    "/setting mute_duration <sekund>|default\n/setting welcome_message <matn>|default\n"
+    "/setting reset - hamma sozlamalarni global qiymatga qaytarish"
+)
+
+# Guruh a'zosining adminligi kesh qilinadi: /setting bilan flood qilish har safar getChatMember chaqirmaydi
+MEMBER_ADMIN_CACHE_MAX = 10000
+member_admin_cache = {}  # (chat_id, user_id) -> (is_admin, expires_at)
+
+async def is_group_admin(chat_id, user_id):
+    key = (chat_id, user_id)
+    now = time.monotonic()
+    cached = member_admin_cache.get(key)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    try:
+        member = await bot.get_chat_member(chat_id, user_id)
+    except Exception as e:
+        print(f"Guruh adminini tekshirishda xato: {e}")
+        return False
+    is_admin = member.status in ("administrator", "creator")
+    if len(member_admin_cache) >= MEMBER_ADMIN_CACHE_MAX:
+        for stale in [k for k, (_, expires) in member_admin_cache.items() if expires <= now]:
+            del member_admin_cache[stale]
+    member_admin_cache[key] = (is_admin, now + (ADMIN_STATUS_TTL if is_admin else NOT_ADMIN_TTL))
+    return is_admin
+
+async def setting_command_allowed(message):
+    # Guruhda faqat adminlar uchun; boshqalarning xabari check_messages ga tushadi
+    if message.chat.type not in ("group", "supergroup"):
+        return True
+    if message.from_user.id in ADMIN_IDS:
+        return True
+    return await is_group_admin(message.chat.id, message.from_user.id)
+
+@router.message(Command("setting"), setting_command_allowed)
+async def group_setting(message: types.Message):
+    if message.chat.type not in ("group", "supergroup"):
+        await message.reply("Bu buyruq faqat guruh ichida ishlaydi.")
+        return
+    chat_id = message.chat.id
+    args = (message.text or "").split(maxsplit=2)
+    if len(args) == 1:
+        await message.reply(format_group_settings(chat_id))
+        return
+    key = args[1].lower()
+    if key == "reset":
+        await store_group_overrides(chat_id, {section: {} for section in GROUP_SETTING_SECTIONS})
+        await message.reply("Guruh sozlamalari global qiymatlarga qaytarildi.")
+        return
+    if len(args) < 3:
+        await message.reply(SETTING_USAGE)
+        return
+    value = args[2].strip()
+    reset = value.lower() == "default"
+    if key in delete_settings:
+        value = value.lower()
+        if not reset and value not in SETTING_ACTIONS:
+            await message.reply(SETTING_USAGE)
+            return
+        await update_group_setting(chat_id, "delete_settings", key, None if reset else value)
+    elif key in SETTING_SWITCHES:
+        value = value.lower()
+        if not reset and value not in ("on", "off"):
+            await message.reply(SETTING_USAGE)
+            return
+        await update_group_setting(chat_id, "welcome_settings", SETTING_SWITCHES[key], None if reset else value == "on")
+    elif key == "mute_duration":
+        if not reset and (not value.isdigit() or int(value) < 30):
+            await message.reply("Mute vaqti kamida 30 soniya bo'lishi kerak.")
+            return
+        await update_group_setting(chat_id, "welcome_settings", "mute_duration", None if reset else int(value))
+    elif key == "welcome_message":
+        await update_group_setting(chat_id, "welcome_settings", "message", None if reset else value)
+    else:
+        await message.reply(SETTING_USAGE)
+        return
+    await message.reply("Sozlama saqlandi!\n\n" + format_group_settings(chat_id))
+
+@router.message(F.chat.type.in_({"group", "supergroup"}), F.text | F.audio | F.document | F.video | F.animation | F.voice | F.photo | F.sticker | F.poll)
+async def check_messages(message: types.Message):
+    # Faqat guruh xabarlari; shaxsiy chatdagi buyruqlar pastdagi ishlovchilarga yetib boradi
+    request_priority.set(HIGH)
+    if not await is_bot_admin(message.chat.id):
+        return
+
+    # Admin emasligini tekshirish
+    if message.from_user.id in ADMIN_IDS:
+        return  # Adminlar taqiqlanmaydi
+
+    if lockdown_joiners and raid_settings.get("autoban_seconds"):
+        if await check_raid_autoban(message):
+            return
+
+    if flood_settings.get("enabled"):
+        flooding, first = flood_detector.hit((message.chat.id, message.from_user.id))
+        if flooding and await handle_flood(message, first):
+            return
+
+    if duplicate_settings.get("enabled"):
+        flagged, first = check_duplicate(message)
+        if flagged:
+            await handle_duplicate(message, first)
+            return
+
+    group_name = message.chat.title or "Noma'lum guruh"
+    group_id = message.chat.id
+    group_username = f"@{message.chat.username}" if message.chat.username else "N/A"
+    user_id = message.from_user.id
+    username = f"@{message.from_user.username}" if message.from_user.username else "N/A"
+    joined_time = joined_times.get(message.chat.id, 0)
+    is_after_join = message.date.timestamp() > joined_time
+    # Vaqtni UTC+05:00 (Toshkent) ga moslash
+    tz = pytz.timezone("Asia/Tashkent")
+    message_time = message.date.astimezone(tz).strftime("%Y-%m-%d %H:%M:%S %Z")
+
+    # Guruhning samarali sozlamalari keshdan olinadi, xabar davomida bitta nusxa ishlatiladi
+    settings, _ = get_group_settings(group_id)
+    action = "allow"  # Default
+    msg_type = "text"
+
+    # Taqiqlangan so'zlar tekshiruvi (text uchun)
+    if message.text:
+        # Kirill/lotin, o'xshash harflar, tinish belgilari va takrorlar bir xil ko'rinishga keltiriladi
+        words = tokenize(message.text)
+        matcher = BANNED_MATCHERS["word"]
+        hits = matcher.find_all(words)
+        fuzzy_hits = []
+        if fuzzy_settings.get("enabled"):
+            fuzzy_hits = [
+                (token, word)
+                for token, word in matcher.find_fuzzy(words, fuzzy_settings["distances"], fuzzy_settings["cache_size"])
+                if word not in hits
+            ]
+        if hits or fuzzy_hits:
+            for word in hits:
+                await log_banned_event(group_id, user_id, "text", word, message.text)
+            for token, word in fuzzy_hits:
+                # Logga yozilgan shakl emas, taqiqlangan so'zning o'zi yoziladi
+                await log_banned_event(group_id, user_id, "text_fuzzy", word, message.text)
+            found = ", ".join(hits + [f"{word} (~{token})" for token, word in fuzzy_hits])
+            alert_admins(
+                (group_id, user_id, found),
+                f"Guruhda taqiqlangan so‘z aniqlandi!\nGuruh nomi: {group_name}\nGuruh ID: {group_id}\nGuruh username: {group_username}\nFoydalanuvchi ID: {user_id}\nUsername: {username}\nSo‘z: {found}\nXabar: {message.text}\nVaqt: {message_time}"
+            )
+            action = settings.get("text", "allow")
+            msg_type = "text"
+
+        # Link tekshiruvi
+        if action == "allow" and any(entity.type == "url" for entity in (message.entities or [])):
+            await log_banned_event(group_id, user_id, "link", "URL", message.text)
+            alert_admins(
+                (group_id, user_id, "URL"),
+                f"Guruhda taqiqlangan link aniqlandi!\nGuruh nomi: {group_name}\nGuruh ID: {group_id}\nGuruh username: {group_username}\nFoydalanuvchi ID: {user_id}\nUsername: {username}\nXabar: {message.text}\nVaqt: {message_time}"
+            )
+            action = settings.get("link", "allow")
+            msg_type = "link"
+
+    # Boshqa turlar
+    elif message.photo:
+        action = settings.get("photo", "allow")
+        msg_type = "photo"
+    elif message.video:
+        action = settings.get("video", "allow")
+        msg_type = "video"
+    elif message.sticker:
+        action = settings.get("sticker", "allow")
+        msg_type = "sticker"
+    elif message.voice:
+        action = settings.get("voice", "allow")
+        msg_type = "voice"
+    elif message.audio:
+        action = settings.get("audio", "allow")
+        msg_type = "audio"
+        # Audio nomini tekshirish (musiqa uchun)
+        if message.audio.title:
+            base_words = tokenize(message.audio.title)
+            hits = BANNED_MATCHERS["audio"].find_all(base_words)
+            if hits:
+                for banned in hits:
+                    await log_banned_event(group_id, user_id, "audio", banned, message.audio.title)
+                found = ", ".join(hits)
+                alert_admins(
+                    (group_id, user_id, found),
+                    f"Guruhda taqiqlangan audio aniqlandi!\nGuruh nomi: {group_name}\nGuruh ID: {group_id}\nGuruh username: {group_username}\nFoydalanuvchi ID: {user_id}\nUsername: {username}\nAudio: {message.audio.title}\nTaqiqlangan: {found}\nVaqt: {message_time}",
+                    media=("audio", message.audio.file_id)
+                )
+                action = settings.get("audio", "allow")
+    elif message.document:
+        file_name = message.document.file_name or "Noma'lum fayl"
+        base_words = tokenize(os.path.splitext(file_name)[0])
+        hits = BANNED_MATCHERS["file"].find_all(base_words)
+        if hits:
+            for banned in hits:
+                await log_banned_event(group_id, user_id, "document", banned, file_name)
+            found = ", ".join(hits)
+            alert_admins(
+                (group_id, user_id, found),
+                f"Guruhda taqiqlangan fayl aniqlandi!\nGuruh nomi: {group_name}\nGuruh ID: {group_id}\nGuruh username: {group_username}\nFoydalanuvchi ID: {user_id}\nUsername: {username}\nFayl: {file_name}\nTaqiqlangan: {found}\nVaqt: {message_time}",
+                media=("document", message.document.file_id)
+            )
+            action = settings.get("document", "allow")
         else:
-            return  # Noma'lum tur
+            action = settings.get("file", "allow")
+        msg_type = "document"
+    elif message.poll:
+        action = settings.get("poll", "allow")
+        msg_type = "poll"
+    else:
+        return  # Noma'lum tur
+
+    # Aniq bloklangan media (O(1) to'plam tekshiruvi)
+    media_hit = find_banned_media(message) if banned_media else None
+    if media_hit is not None:
+        kind, value = media_hit
+        await log_banned_event(group_id, user_id, "media", f"{kind}:{value}", message.caption or "")
+        alert_admins(
+            (group_id, user_id, value),
+            f"Guruhda bloklangan media aniqlandi!\nGuruh nomi: {group_name}\nGuruh ID: {group_id}\nGuruh username: {group_username}\nFoydalanuvchi ID: {user_id}\nUsername: {username}\nTuri: {msg_type}\nBlok: {kind}:{value}\nVaqt: {message_time}"
+        )
+        action = settings.get("media", "delete")
 
-        # Action bo'yicha bajarish
-        if action == "delete":
-            try:
-                await bot.delete_message(message.chat.id, message.message_id)
-                print(f"{msg_type} o'chirildi")
-                if is_after_join:
-                    await message.reply(f"{msg_type.capitalize()} yuborish taqiqlangan! Xabar o'chirildi.")
-            except Exception as e:
-                print(f"{msg_type} o'chirishda xato: {e}")
-        elif action == "warn":
-            try:
-                # Xabarni o'chirmaymiz, lekin ogohlantirish yuboramiz
-                if is_after_join:
-                    await message.reply(f"{msg_type.capitalize()} yuborish taqiqlangan! Keyingi safar o'chiriladi. Iltimos, qoidalariga rioya qiling.")
-                print(f"{msg_type} uchun ogohlantirish berildi")
-            except Exception as e:
-                print(f"Ogohlantirish yuborishda xato: {e}")
-        # "allow" uchun hech narsa qilmaymiz
+    # Action bo'yicha bajarish
+    if action == "delete":
+        # O'chirish va guruhga xabar berish navbat orqali to'plam bo'lib bajariladi
+        schedule_delete(message.chat.id, message.message_id, msg_type if is_after_join else None)
+    elif action == "warn":
+        try:
+            # Xabarni o'chirmaymiz, lekin ogohlantirish yuboramiz
+            if is_after_join:
+                await message.reply(f"{msg_type.capitalize()} yuborish taqiqlangan! Keyingi safar o'chiriladi. Iltimos, qoidalariga rioya qiling.")
+            print(f"{msg_type} uchun ogohlantirish berildi")
+        except Exception as e:
+            print(f"Ogohlantirish yuborishda xato: {e}")
+    # "allow" uchun hech narsa qilmaymiz
 
 @router.message(Command("update_lists"))
 async def update_lists(message: types.Message):
     if message.from_user.id not in ADMIN_IDS:
         await message.reply("Faqat adminlar uchun!")
         return
-    global BANNED_WORDS, BANNED_AUDIO_NAMES, BANNED_FILE_NAMES
-    BANNED_WORDS = load_banned_words()
-    BANNED_AUDIO_NAMES = load_banned_audio_names()
-    BANNED_FILE_NAMES = load_banned_file_names()
-    await message.reply(f"Taqiqlangan ro'yxatlar yangilandi!\nSo'zlar: {len(BANNED_WORDS)} ta\nAudio: {len(BANNED_AUDIO_NAMES)} ta\nFayllar: {len(BANNED_FILE_NAMES)} ta")
+    admin_jobs.submit(reimport_banned_lists(message))
 
-@router.message(Command("groups"))
-async def groups_list(message: types.Message):
+async def reimport_banned_lists(message):
+    # Excel fayllardagi ro'yxatlar bazadagilarning o'rniga import qilinadi
+    errors = []
+    for kind, file_path in BANNED_FILES.items():
+        try:
+            await import_banned_list(kind)
+        except Exception as e:
+            print(f"{file_path} ni import qilishda xato: {e}")
+            errors.append(f"{file_path}: {e}")
+    text = f"Taqiqlangan ro'yxatlar yangilandi!\nSo'zlar: {len(BANNED_MATCHERS['word'])} ta\nAudio: {len(BANNED_MATCHERS['audio'])} ta\nFayllar: {len(BANNED_MATCHERS['file'])} ta"
+    if errors:
+        text += "\n\nQuyidagi fayllarni o'qib bo'lmadi, joriy ro'yxat o'zgartirilmadi:\n" + "\n".join(errors)
+    await message.reply(text)
+
+@router.message(Command("export_lists"))
+async def export_lists(message: types.Message):
     if message.from_user.id not in ADMIN_IDS:
         await message.reply("Faqat adminlar uchun!")
         return
-    groups = get_all_groups(conn)
-    if not groups:
-        await message.reply("Hozircha guruhlar yo'q.")
-        return
+    admin_jobs.submit(send_banned_exports(message))
+
+async def send_banned_exports(message):
+    # Joriy ro'yxatlar Excel fayllarga yoziladi va adminga yuboriladi
+    for kind, file_path in BANNED_FILES.items():
+        items = list(BANNED_MATCHERS[kind].items)
+        await admin_jobs.run_cpu(export_banned_excel, file_path, items)
+        remember_mtime(file_path)
+        # Eksport qilingan fayl bazadagi ro'yxat bilan bir xil, keyingi ishga tushishda qayta import qilinmaydi
+        source_hash = await admin_jobs.run_cpu(file_hash, file_path)
+        await db.run(mark_banned_exported, kind, source_hash)
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        await message.reply_document(
+            BufferedInputFile(data, filename=file_path),
+            caption=f"{file_path}: {len(items)} ta"
+        )
+
+def build_groups_csv(groups):
+    import pandas as pd
     df = pd.DataFrame(groups, columns=['Tartib raqami', 'Guruh nomi', 'Guruh ID si'])
     csv_buffer = io.StringIO()
     df.to_csv(csv_buffer, index=False, encoding='utf-8')
-    csv_buffer.seek(0)
+    return csv_buffer.getvalue().encode('utf-8')
+
+async def send_groups_csv(message, groups):
+    csv_data = await admin_jobs.run_cpu(build_groups_csv, groups)
     await message.reply_document(
-        BufferedInputFile(csv_buffer.getvalue().encode('utf-8'), filename='guruhlar.csv'),
+        BufferedInputFile(csv_data, filename='guruhlar.csv'),
         caption=f"Jami {len(groups)} ta guruh ma'lumotlari fayl sifatida yuborildi."
     )
 
+@router.message(Command("groups"))
+async def groups_list(message: types.Message):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.reply("Faqat adminlar uchun!")
+        return
+    groups = await db.run(get_all_groups)
+    if not groups:
+        await message.reply("Hozircha guruhlar yo'q.")
+        return
+    admin_jobs.submit(send_groups_csv(message, groups))
+
 @router.message(Command("admin"))
 async def admin_panel(message: types.Message):
     if message.from_user.id not in ADMIN_IDS:
@@ -722,20 +1826,13 @@ async def groups_list_cb(callback: types.CallbackQuery):
     if callback.from_user.id not in ADMIN_IDS:
         await callback.answer("Faqat adminlar uchun!", show_alert=True)
         return
-    groups = get_all_groups(conn)
+    groups = await db.run(get_all_groups)
     if not groups:
         await callback.message.edit_text("Hozircha guruhlar yo'q.")
         await callback.answer()
         return
-    df = pd.DataFrame(groups, columns=['Tartib raqami', 'Guruh nomi', 'Guruh ID si'])
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False, encoding='utf-8')
-    csv_buffer.seek(0)
-    await callback.message.reply_document(
-        BufferedInputFile(csv_buffer.getvalue().encode('utf-8'), filename='guruhlar.csv'),
-        caption=f"Jami {len(groups)} ta guruh ma'lumotlari fayl sifatida yuborildi."
-    )
-    await callback.answer("Guruhlar ro'yxati yuborildi!")
+    admin_jobs.submit(send_groups_csv(callback.message, groups))
+    await callback.answer("Guruhlar ro'yxati tayyorlanmoqda...")
 
 @router.callback_query(F.data == "group_count")
 async def show_group_count(callback: types.CallbackQuery):
@@ -743,30 +1840,28 @@ async def show_group_count(callback: types.CallbackQuery):
         await callback.answer("Faqat adminlar uchun!", show_alert=True)
         return
     try:
-        groups = get_all_groups(conn)
-        total_groups = len(groups)
-        admin_groups = 0
-        me = await bot.get_me()
-        for group in groups:
-            chat_id = group[2]
-            try:
-                chat_member = await bot.get_chat_member(chat_id, me.id)
-                if chat_member.status in ("administrator", "creator"):
-                    admin_groups += 1
-            except Exception as e:
-                print(f"Guruh {chat_id} tekshirishda xato: {e}")
-                continue
-        await callback.message.edit_text(
-            f"Jami guruhlar: {total_groups}\nAdminlik berilgan guruhlar: {admin_groups}",
-            reply_markup=types.InlineKeyboardMarkup(inline_keyboard=[
-                [types.InlineKeyboardButton(text="Orqaga", callback_data="back_admin")]
-            ])
-        )
-        await callback.answer("Ma'lumot yangilandi!")
+        # Telegramga so'rov yo'q: fon tekshiruvi saqlagan natija ko'rsatiladi
+        await callback.message.edit_text(await group_count_text(), reply_markup=group_count_keyboard())
+        await callback.answer()
     except Exception as e:
         await callback.answer(f"Guruhlar ro'yxatini olishda xatolik: {str(e)}", show_alert=True)
         print(f"Guruhlar callback da xato: {e}")
 
+@router.callback_query(F.data == "group_count_refresh")
+async def refresh_group_count(callback: types.CallbackQuery):
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("Faqat adminlar uchun!", show_alert=True)
+        return
+    if admin_scan_lock.locked():
+        await callback.answer("Tekshiruv allaqachon ketmoqda.")
+        return
+    await callback.answer("Tekshiruv boshlandi...")
+    admin_jobs.submit(rescan_and_show(callback.message))
+
+async def rescan_and_show(message):
+    await run_admin_scan()
+    await message.edit_text(await group_count_text(), reply_markup=group_count_keyboard())
+
 @router.callback_query(F.data == "banned_lists")
 async def banned_lists(callback: types.CallbackQuery):
     if callback.from_user.id not in ADMIN_IDS:
@@ -791,7 +1886,8 @@ async def words_list(callback: types.CallbackQuery):
         [types.InlineKeyboardButton(text="O'chirish", callback_data="del_word_cb")],
         [types.InlineKeyboardButton(text="Orqaga", callback_data="banned_lists")]
     ])
-    text = f"Mavjud taqiq so'zlar ({len(BANNED_WORDS)} ta):\n" + "\n".join(BANNED_WORDS[:20]) + ("\n..." if len(BANNED_WORDS) > 20 else "")
+    matcher = BANNED_MATCHERS["word"]
+    text = f"Mavjud taqiq so'zlar ({len(matcher)} ta):\n" + "\n".join(matcher.head(20)) + ("\n..." if len(matcher) > 20 else "")
     await callback.message.edit_text(text, reply_markup=keyboard)
     await callback.answer()
 
@@ -823,7 +1919,8 @@ async def audio_list(callback: types.CallbackQuery):
         [types.InlineKeyboardButton(text="O'chirish", callback_data="del_audio_cb")],
         [types.InlineKeyboardButton(text="Orqaga", callback_data="banned_lists")]
     ])
-    text = f"Mavjud taqiq audio ({len(BANNED_AUDIO_NAMES)} ta):\n" + "\n".join(BANNED_AUDIO_NAMES[:20]) + ("\n..." if len(BANNED_AUDIO_NAMES) > 20 else "")
+    matcher = BANNED_MATCHERS["audio"]
+    text = f"Mavjud taqiq audio ({len(matcher)} ta):\n" + "\n".join(matcher.head(20)) + ("\n..." if len(matcher) > 20 else "")
     await callback.message.edit_text(text, reply_markup=keyboard)
     await callback.answer()
 
@@ -855,7 +1952,8 @@ async def files_list(callback: types.CallbackQuery):
         [types.InlineKeyboardButton(text="O'chirish", callback_data="del_file_cb")],
         [types.InlineKeyboardButton(text="Orqaga", callback_data="banned_lists")]
     ])
-    text = f"Mavjud taqiq fayllar ({len(BANNED_FILE_NAMES)} ta):\n" + "\n".join(BANNED_FILE_NAMES[:20]) + ("\n..." if len(BANNED_FILE_NAMES) > 20 else "")
+    matcher = BANNED_MATCHERS["file"]
+    text = f"Mavjud taqiq fayllar ({len(matcher)} ta):\n" + "\n".join(matcher.head(20)) + ("\n..." if len(matcher) > 20 else "")
     await callback.message.edit_text(text, reply_markup=keyboard)
     await callback.answer()
 
@@ -1240,35 +2338,280 @@ async def handle(request):
     # Render portni tekshirish uchun oddiy javob
     return web.Response(text="✅ Telegram bot Render.com da ishlayapti!")
 
-async def start_bot():
+async def start_bot(stop_event):
     # Botni ishga tushirishdan oldin konfiguratsiyalarni yuklash
     load_config()
     check_and_create_files()
     print("🤖 Telegram bot ishga tushmoqda...")
     try:
-        await dp.start_polling(bot)
+        # Oldin webhook o'rnatilgan bo'lsa, getUpdates ishlashi uchun uni o'chiramiz
+        await bot.delete_webhook()
+        # Signallarni main() boshqaradi, aiogram o'z ishlovchisini o'rnatmasin
+        await dp.start_polling(bot, handle_signals=False)
     except Exception as e:
         print(f"Botni ishga tushirishda xatolik: {e}")
-        
+    finally:
+        # Polling to'xtasa, jarayon ham tartibli yakunlanadi (health server yolg'iz qolmaydi)
+        stop_event.set()
+
+async def on_webhook_startup(bot: Bot):
+    await bot.set_webhook(
+        f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+    print(f"🤖 Telegram bot webhook rejimida ishga tushdi: {WEBHOOK_URL}{WEBHOOK_PATH}")
+
+async def on_webhook_shutdown(bot: Bot):
+    await bot.session.close()
+
+# dp.startup tugamaguncha (ro'yxatlar yuklanmaguncha) webhook yangilanishlari qabul qilinmaydi
+webhook_ready = asyncio.Event()
+
+@web.middleware
+async def wait_for_webhook_startup(request, handler):
+    if request.path == WEBHOOK_PATH and not webhook_ready.is_set():
+        # Telegram javob 2xx bo'lmasa yangilanishni keyinroq qayta yuboradi
+        return web.Response(status=503)
+    return await handler(request)
+
+def setup_webhook(app):
+    load_config()
+    check_and_create_files()
+    dp.startup.register(on_webhook_startup)
+    dp.shutdown.register(on_webhook_shutdown)
+    # Yangilanishlar fon vazifalarida parallel qayta ishlanadi, secret token tekshiriladi
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    # dp.startup/shutdown aiohttp hodisalariga bog'lanmaydi: ular runner.setup() ichida, health
+    # server ochilishidan oldin bajarilardi. main() ularni sayt ishga tushgach o'zi chaqiradi
+    app.middlewares.append(wait_for_webhook_startup)
+
+async def start_webhook(startup, stop_event):
+    # Og'ir ishga tushirish (ro'yxatlar, set_webhook) health server javob bera boshlagach bajariladi
+    try:
+        await startup
+        webhook_ready.set()
+    except Exception as e:
+        print(f"Botni ishga tushirishda xatolik: {e}")
+        stop_event.set()
+
+# Ko'p jarayonli rejim: asosiy jarayon webhookni qabul qilib, yangilanishni chat_id bo'yicha ishchiga yuboradi
+def shard_for_update(update, workers):
+    key = update.get("update_id", 0)
+    for field, payload in update.items():
+        if field == "update_id" or not isinstance(payload, dict):
+            continue
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if chat:
+            key = chat["id"]
+        elif payload.get("from"):
+            key = payload["from"]["id"]
+        break
+    return key % workers
+
+async def handle_sharded_webhook(request):
+    if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        return web.Response(status=401)
+    update = await request.json()
+    worker_queues[shard_for_update(update, len(worker_queues))].put(("update", (update, shard_duplicate_verdict(update))))
+    return web.json_response({})
+
+def shard_duplicate_verdict(update):
+    # Asosiy jarayon barcha guruhlarni ko'radi, shuning uchun spam to'lqini shu yerda sanaladi
+    message = update.get("message")
+    if not duplicate_settings.get("enabled") or not isinstance(message, dict):
+        return None
+    chat = message.get("chat") or {}
+    if chat.get("type") not in ("group", "supergroup"):
+        return None
+    key = raw_duplicate_key(message)
+    if key is None:
+        return None
+    return duplicate_detector.hit(key, chat["id"])
+
+async def feed_sharded_update(update, verdict):
+    shard_duplicate.set(verdict)
+    await dp.feed_raw_update(bot, update)
+
+async def read_master_queue(queue):
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await loop.run_in_executor(None, queue.get)
+        if item is None:
+            break
+        kind, payload = item
+        if kind == "config":
+            apply_config(payload)
+
+async def apply_snapshot(kind, payload):
+    if kind == "config":
+        apply_config(payload)
+    elif kind == "banned":
+        await set_banned_list(*payload)
+    elif kind == "banned_add":
+        list_kind, item = payload
+        BANNED_MATCHERS[list_kind].add(item)
+    elif kind == "banned_remove":
+        list_kind, item = payload
+        BANNED_MATCHERS[list_kind].remove(item)
+    elif kind == "group_settings":
+        set_group_overrides(*payload)
+    elif kind == "media_add":
+        banned_media.add(tuple(payload))
+    elif kind == "media_remove":
+        banned_media.discard(tuple(payload))
+
+async def run_worker(index, queues, master):
+    global worker_index, worker_queues, master_queue, notify_global_bucket
+    worker_index = index
+    worker_queues = queues
+    master_queue = master
+    # Telegramning umumiy limiti ishchilar orasida bo'linadi
+    notify_global_bucket = TokenBucket(max(1, 25 / len(queues)))
+    load_config()
+    start_log_writer()
+    start_notify_workers()
+    await dp.emit_startup(bot=bot)
+    print(f"🤖 Ishchi #{index} ishga tushdi.")
+    loop = asyncio.get_running_loop()
+    inbox = queues[index]
+    with contextlib.suppress(NotImplementedError):
+        loop.add_signal_handler(signal.SIGTERM, inbox.put, None)
+    pending = set()
+    while True:
+        item = await loop.run_in_executor(None, inbox.get)
+        if item is None:
+            break
+        kind, payload = item
+        if kind == "update":
+            task = asyncio.create_task(feed_sharded_update(*payload))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        else:
+            await apply_snapshot(kind, payload)
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    await dp.emit_shutdown(bot=bot)
+    await bot.session.close()
+
+def worker_main(index, queues, master):
+    # To'xtatishni asosiy jarayon boshqaradi (navbatga None yuboradi)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asyncio.run(run_worker(index, queues, master))
+    finally:
+        db.close()
+
+def spawn_worker(ctx, index, queues, master):
+    process = ctx.Process(target=worker_main, args=(index, queues, master), name=f"bot-worker-{index}", daemon=True)
+    process.start()
+    return process
+
+async def supervise_workers(ctx, processes, queues, master):
+    # Yiqilgan ishchi o'sha navbat bilan qayta ishga tushiriladi
+    while True:
+        await asyncio.sleep(5)
+        for index, process in enumerate(processes):
+            if not process.is_alive():
+                print(f"Ishchi #{index} to'xtab qoldi (kod {process.exitcode}), qayta ishga tushirilmoqda")
+                processes[index] = spawn_worker(ctx, index, queues, master)
+
+def setup_sharded_webhook(app):
+    global worker_queues
+    load_config()
+    check_and_create_files()
+    ctx = multiprocessing.get_context("spawn")
+    worker_queues = [ctx.Queue() for _ in range(BOT_WORKERS)]
+    master = ctx.Queue()
+    processes = [spawn_worker(ctx, index, worker_queues, master) for index in range(BOT_WORKERS)]
+    app.router.add_post(WEBHOOK_PATH, handle_sharded_webhook)
+
+    async def on_startup(app):
+        app["supervisor"] = asyncio.create_task(supervise_workers(ctx, processes, worker_queues, master))
+        app["master_reader"] = asyncio.create_task(read_master_queue(master))
+
+    async def on_cleanup(app):
+        app["supervisor"].cancel()
+        master.put(None)
+        await app["master_reader"]
+        for queue in worker_queues:
+            queue.put(None)
+        for process in processes:
+            await asyncio.to_thread(process.join, 10)
+        await bot.session.close()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+
 async def main():
-    # Telegram botni alohida vazifa (task) sifatida ishga tushiramiz
-    asyncio.create_task(start_bot())
+    if WEBHOOK_URL and not WEBHOOK_SECRET:
+        print("❌ WEBHOOK_URL berilgan, lekin WEBHOOK_SECRET o'rnatilmagan. Bot ishga tushirilmadi.")
+        raise SystemExit(1)
+
+    # SIGTERM/SIGINT kelganda ham tartibli to'xtaymiz
+    stop_event = asyncio.Event()
+    with contextlib.suppress(NotImplementedError):
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            asyncio.get_running_loop().add_signal_handler(sig, stop_event.set)
 
     # Render serveri uchun minimal web-server ochamiz
     app = web.Application()
     app.router.add_get("/", handle)
 
+    polling = False
+    if WEBHOOK_URL and BOT_WORKERS > 1:
+        # Asosiy jarayon faqat yangilanishlarni ishchilarga taqsimlaydi
+        setup_sharded_webhook(app)
+    else:
+        if BOT_WORKERS > 1:
+            print("BOT_WORKERS faqat webhook rejimida ishlaydi, bitta jarayonda davom etilmoqda.")
+        start_log_writer()
+        start_notify_workers()
+        if WEBHOOK_URL:
+            # Webhook shu aiohttp ilovasida qabul qilinadi
+            setup_webhook(app)
+        else:
+            polling = True
+
     port = int(os.environ.get("PORT", 8080))
-    print(f"🌐 Render web server {port}-portda ishga tushdi.")
 
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", port)
     await site.start()
+    print(f"🌐 Render web server {port}-portda ishga tushdi.")
+    report_startup("Health server tayyor")
+
+    polling_task = None
+    startup_task = None
+    if polling:
+        # Health server javob bera boshlagach, botni alohida vazifa (task) sifatida ishga tushiramiz
+        polling_task = asyncio.create_task(start_bot(stop_event))
+    elif BOT_WORKERS > 1:
+        # Asosiy jarayonda faqat webhook o'rnatiladi, ro'yxatlarni ishchilar yuklaydi
+        startup_task = asyncio.create_task(start_webhook(on_webhook_startup(bot), stop_event))
+    else:
+        startup_task = asyncio.create_task(start_webhook(dp.emit_startup(bot=bot, dispatcher=dp), stop_event))
 
-    # Serverni doimiy ushlab turish uchun cheksiz sikl
-    while True:
-        await asyncio.sleep(3600)
+    # Serverni to'xtatish signaligacha ushlab turamiz
+    try:
+        await stop_event.wait()
+        print("⏹ Bot to'xtatilmoqda...")
+    finally:
+        if polling_task is not None:
+            # Polling to'xtatiladi va dp.shutdown ishlovchilari bajarilishi kutiladi
+            with contextlib.suppress(RuntimeError):
+                await dp.stop_polling()
+            await asyncio.gather(polling_task, return_exceptions=True)
+        if startup_task is not None:
+            startup_task.cancel()
+            await asyncio.gather(startup_task, return_exceptions=True)
+        await runner.cleanup()
+        if startup_task is not None and BOT_WORKERS <= 1:
+            await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        # To'xtashda navbatdagi loglar albatta yoziladi
+        await stop_notify_workers()
+        await stop_log_writer()
 
 if __name__ == "__main__":
     check_and_create_files()  # Fayllarni tekshirish va yaratish
@@ -1277,4 +2620,4 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Bot ishga tushirishda xatolik: {str(e)}")
     finally:
-        conn.close()
+        db.close()
@@ -0,0 +1,253 @@
+from collections import Counter, OrderedDict, deque
+from itertools import chain, islice
+
+from normalize import tokenize
+
+
+def edit_distance(a, b, limit):
+    # Levenshtein masofasi; limit dan oshishi aniq bo'lsa, limit + 1 qaytariladi
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j - 1] + (ca != cb), previous[j] + 1, current[j - 1] + 1))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def bigrams(word):
+    padded = "^" + word + "$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class NgramIndex:
+    # Bigramlar bo'yicha teskari indeks. Bitta tahrir ko'pi bilan 2 ta bigramni buzadi,
+    # shuning uchun umumiy bigramlari kam nomzodlar masofa hisoblanmasdan tashlab yuboriladi.
+    # Ro'yxatlar so'z uzunligi bo'yicha ajratilgan: uzunligi limit dan ko'p farq qiladigan
+    # so'zlar umuman sanalmaydi. So'zlar bittalab qo'shiladi va o'chiriladi.
+    __slots__ = ("postings", "sizes", "lengths")
+
+    def __init__(self, words=()):
+        self.postings = {}  # (uzunlik, bigram) -> so'zlar
+        self.sizes = {}
+        self.lengths = {}  # uzunlik -> so'zlar
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if word in self.sizes:
+            return
+        grams = bigrams(word)
+        self.sizes[word] = len(grams)
+        length = len(word)
+        self.lengths.setdefault(length, set()).add(word)
+        for gram in grams:
+            self.postings.setdefault((length, gram), set()).add(word)
+
+    def remove(self, word):
+        if self.sizes.pop(word, None) is None:
+            return
+        length = len(word)
+        self._discard(self.lengths, length, word)
+        for gram in bigrams(word):
+            self._discard(self.postings, (length, gram), word)
+
+    @staticmethod
+    def _discard(table, key, word):
+        words = table[key]
+        words.discard(word)
+        if not words:
+            del table[key]
+
+    def search(self, word, limit):
+        # limit ichidagi eng yaqin so'zni qaytaradi, topilmasa None
+        grams = bigrams(word)
+        lengths = range(len(word) - limit, len(word) + limit + 1)
+        if len(grams) <= 2 * limit:
+            # Juda qisqa so'zda filtr ishlamaydi, mos uzunlikdagi hamma so'zlar tekshiriladi
+            candidates = [candidate for length in lengths for candidate in self.lengths.get(length, ())]
+        else:
+            # Umumiy bigramlar C darajasida (Counter) sanaladi
+            postings = self.postings
+            counts = Counter(chain.from_iterable(
+                postings.get((length, gram), ()) for length in lengths for gram in grams
+            ))
+            sizes = self.sizes
+            need = len(grams) - 2 * limit
+            candidates = [
+                candidate for candidate, shared in counts.items()
+                if shared >= need and shared >= sizes[candidate] - 2 * limit
+            ]
+        best = None
+        best_distance = limit + 1
+        # To'plamlar tartibi jarayonga bog'liq: teng masofada natija barqaror bo'lishi uchun saralanadi
+        for candidate in sorted(candidates):
+            distance = edit_distance(word, candidate, best_distance - 1)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+        return best
+
+
+class BannedMatcher:
+    # Taqiqlangan so'z va iboralar uchun bir martalik kompilyatsiya qilingan indeks.
+    # Bitta so'zlar hash-to'plamda, ko'p so'zli iboralar esa tokenlar ustida
+    # qurilgan Aho-Corasick avtomatida saqlanadi. Xabar bir marta o'qiladi.
+    # Elementlar normalize.tokenize orqali kanonik tokenlarga aylantiriladi,
+    # find_all ham xuddi shu funksiyadan chiqqan tokenlarni kutadi.
+    # Noaniq (fuzzy) qidiruv uchun bigram indeksi matcher bilan birga (event loop dan
+    # tashqarida) quriladi va add/remove da bittalab yangilanadi.
+    __slots__ = ("items", "words", "goto", "fail", "output", "index", "fuzzy_cache", "fuzzy_key")
+
+    def __init__(self, items):
+        self.items = {}
+        self.words = {}
+        for item in items:
+            if item in self.items:
+                continue
+            tokens = tuple(tokenize(item))
+            self.items[item] = tokens
+            if len(tokens) == 1:
+                self.words.setdefault(tokens[0], item)
+        self.index = NgramIndex(self.words)
+        self._reset_fuzzy()
+        self._build()
+
+    def _reset_fuzzy(self):
+        # Indeks o'zgargach oldingi qidiruv natijalari eskiradi
+        self.fuzzy_cache = OrderedDict()
+        self.fuzzy_key = None
+
+    def _build(self):
+        goto = [{}]
+        fail = [0]
+        output = [()]
+        for item, tokens in self.items.items():
+            if len(tokens) < 2:
+                continue
+            state = 0
+            for token in tokens:
+                nxt = goto[state].get(token)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][token] = nxt
+                    goto.append({})
+                    fail.append(0)
+                    output.append(())
+                state = nxt
+            if item not in output[state]:
+                output[state] = output[state] + (item,)
+
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and token not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(token, 0)
+                if output[fail[nxt]]:
+                    output[nxt] = output[nxt] + output[fail[nxt]]
+        # Tayyor avtomat bitta o'zlashtirish bilan almashtiriladi
+        self.goto, self.fail, self.output = goto, fail, output
+
+    def add(self, item):
+        # Bitta so'z O(1) da qo'shiladi; iboralar uchun faqat iboralar avtomati qayta quriladi
+        if item in self.items:
+            return False
+        tokens = tuple(tokenize(item))
+        self.items[item] = tokens
+        if len(tokens) == 1:
+            if tokens[0] not in self.words:
+                self.words[tokens[0]] = item
+                self.index.add(tokens[0])
+                self._reset_fuzzy()
+        elif tokens:
+            self._build()
+        return True
+
+    def remove(self, item):
+        if item not in self.items:
+            return False
+        tokens = self.items.pop(item)
+        if len(tokens) == 1:
+            if self.words.get(tokens[0]) == item:
+                del self.words[tokens[0]]
+                # Xuddi shu kanonik ko'rinishdagi boshqa element bo'lsa, u o'rnini egallaydi
+                for other, other_tokens in self.items.items():
+                    if other_tokens == tokens:
+                        self.words[tokens[0]] = other
+                        break
+                else:
+                    self.index.remove(tokens[0])
+                self._reset_fuzzy()
+        elif tokens:
+            self._build()
+        return True
+
+    def find_all(self, tokens):
+        # Barcha mosliklarni birinchi uchragan tartibda qaytaradi
+        hits = []
+        seen = set()
+        words = self.words
+        goto, fail, output = self.goto, self.fail, self.output
+        has_phrases = len(goto) > 1
+        state = 0
+        for token in tokens:
+            item = words.get(token)
+            if item is not None and item not in seen:
+                seen.add(item)
+                hits.append(item)
+            if not has_phrases:
+                continue
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for item in output[state]:
+                if item not in seen:
+                    seen.add(item)
+                    hits.append(item)
+        return hits
+
+    def find_fuzzy(self, tokens, distances, cache_size=10000):
+        # Aniq mos kelmagan tokenlar uchun eng yaqin taqiqlangan so'z qidiriladi.
+        # distances: [[minimal uzunlik, maksimal masofa], ...], uzunlik o'sish tartibida.
+        # Natija: [(token, taqiqlangan element), ...]
+        key = tuple(tuple(pair) for pair in distances)
+        if key != self.fuzzy_key:
+            self.fuzzy_cache = OrderedDict()
+            self.fuzzy_key = key
+        cache = self.fuzzy_cache
+        words = self.words
+        hits = []
+        seen = set()
+        for token in tokens:
+            if token in words:
+                continue
+            if token in cache:
+                cache.move_to_end(token)
+                item = cache[token]
+            else:
+                limit = 0
+                for min_length, distance in key:
+                    if len(token) >= min_length:
+                        limit = distance
+                found = self.index.search(token, limit) if limit else None
+                item = words[found] if found is not None else None
+                cache[token] = item
+                if len(cache) > cache_size:
+                    cache.popitem(last=False)
+            if item is not None and item not in seen:
+                seen.add(item)
+                hits.append((token, item))
+        return hits
+
+    def head(self, n):
+        return list(islice(self.items, n))
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,92 @@
+import re
+import unicodedata
+
+# Xabarlar va taqiqlangan ro'yxatlar bir xil kanonik ko'rinishga keltiriladi:
+# NFKC, kichik harf, ko'rinmas belgilar va tutuq belgisini olib tashlash,
+# kirill -> lotin (o'zbek), aralash yozuvdagi o'xshash harflar, takroriy harflar.
+# Barcha jadvallar modul yuklanganda bir marta tuziladi.
+
+# Ko'rinmas belgilar, yumshoq chiziqcha va bezak uchun qo'shiladigan diakritiklar
+_INVISIBLE = [0x00AD, 0x034F, 0x061C, 0x180E, 0x200B, 0x200C, 0x200D, 0x200E, 0x200F, 0x2060, 0x2061, 0x2062, 0x2063, 0x2064, 0xFEFF]
+_COMBINING_RANGES = [(0x0300, 0x036F), (0x0483, 0x0489), (0x1AB0, 0x1AFF), (0x1DC0, 0x1DFF), (0x20D0, 0x20FF), (0xFE20, 0xFE2F)]
+# O'zbek lotin yozuvidagi tutuq belgisi variantlari (o', g', so'z) olib tashlanadi
+_APOSTROPHES = "'`´ʹʻʼʽˈ‘’‛′"
+
+# Yunon harflari lotin harflariga o'xshashligi bo'yicha
+_GREEK = {
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "μ": "m", "ν": "v",
+    "ο": "o", "ρ": "p", "τ": "t", "υ": "u", "χ": "x", "ς": "s", "σ": "s", "ω": "w",
+}
+
+def _build_base_table():
+    table = {cp: None for cp in _INVISIBLE}
+    for start, end in _COMBINING_RANGES:
+        for cp in range(start, end + 1):
+            table[cp] = None
+    for ch in _APOSTROPHES:
+        table[ord(ch)] = None
+    # Lotin harflaridagi urg'u va belgilar asosiy harfga tushiriladi (é -> e, ş -> s)
+    for cp in range(0x00C0, 0x0250):
+        base = unicodedata.normalize("NFKD", chr(cp))[:1]
+        if base.isascii() and base.isalpha():
+            table[cp] = base.lower()
+    for ch, latin in _GREEK.items():
+        table[ord(ch)] = latin
+    return table
+
+_BASE_TABLE = _build_base_table()
+
+# O'zbek kirill -> lotin transliteratsiyasi (tutuq belgisisiz kanonik ko'rinish)
+_CYRILLIC_TO_LATIN = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "j",
+    "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "x", "ц": "s",
+    "ч": "ch", "ш": "sh", "щ": "sh", "ъ": None, "ы": "i", "ь": None, "э": "e", "ю": "yu",
+    "я": "ya", "ў": "o", "қ": "q", "ғ": "g", "ҳ": "h", "і": "i", "ј": "j", "ѕ": "s",
+})
+
+# Lotin so'z ichiga qo'shilgan kirill harflari ko'rinishi bo'yicha almashtiriladi (рorn -> porn)
+_CYRILLIC_HOMOGLYPHS = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p",
+    "с": "c", "т": "t", "у": "y", "х": "x", "і": "i", "ј": "j", "ѕ": "s", "ԁ": "d",
+    "һ": "h", "ԛ": "q", "ԝ": "w",
+})
+
+# Kirill so'z ichiga qo'shilgan lotin harflari esa teskari yo'nalishda (нaркотик -> наркотик)
+_LATIN_HOMOGLYPHS = str.maketrans({
+    "a": "а", "b": "в", "c": "с", "e": "е", "h": "н", "i": "і", "j": "ј", "k": "к",
+    "m": "м", "o": "о", "p": "р", "s": "ѕ", "t": "т", "x": "х", "y": "у",
+})
+
+_SEPARATORS = re.compile(r"[\W_]+")
+_REPEATS = re.compile(r"(.)\1+")
+_CYRILLIC = re.compile(r"[Ѐ-ӿ]")
+_LATIN = re.compile(r"[a-z]")
+
+
+def _fold_token(token):
+    if token.isascii() or not _CYRILLIC.search(token):
+        return token
+    latin = len(_LATIN.findall(token))
+    if latin:
+        # O'xshash harflar so'zning asosiy yozuviga moslanadi
+        if latin >= len(_CYRILLIC.findall(token)):
+            return token.translate(_CYRILLIC_HOMOGLYPHS).translate(_CYRILLIC_TO_LATIN)
+        token = token.translate(_LATIN_HOMOGLYPHS)
+    if token[0] == "е":
+        # So'z boshidagi "е" lotinda "ye" bo'ladi (ер -> yer)
+        token = "y" + token
+    return token.translate(_CYRILLIC_TO_LATIN)
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKC", text).lower().translate(_BASE_TABLE)
+    text = _SEPARATORS.sub(" ", text)
+    if not text.isascii():
+        text = " ".join(_fold_token(token) for token in text.split())
+    # Takroriy harflar bittaga qisqartiriladi (yomoooon -> yomon)
+    return _REPEATS.sub(r"\1", text)
+
+
+def tokenize(text):
+    return normalize(text).split() if text else []
@@ -0,0 +1,122 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+
+# Ustuvorlik sinflari: kichik son - yuqori ustuvorlik
+HIGH = 0    # moderatsiya (o'chirish, cheklash, ban)
+NORMAL = 1  # odatiy javoblar va ogohlantirishlar
+LOW = 2     # admin hisobotlari va fon ishlari
+
+# Joriy vazifaning ustuvorligi; yangi vazifalarga avtomatik nusxalanadi
+request_priority = contextvars.ContextVar("request_priority", default=NORMAL)
+
+
+class PriorityGate:
+    # Bir vaqtda bajariladigan API so'rovlari soni cheklangan. Bo'sh joy ustuvorlik
+    # tartibida beriladi, LOW so'rovlar esa `low_slots` tadan ko'p joy egallamaydi.
+    def __init__(self, slots, low_slots):
+        self.slots = slots
+        self.low_slots = low_slots
+        self.active = 0
+        self.low_active = 0
+        self.waiters = []
+        self.counter = itertools.count()
+
+    def _can_start(self, priority):
+        return self.active < self.slots and (priority < LOW or self.low_active < self.low_slots)
+
+    def _take(self, priority):
+        self.active += 1
+        if priority >= LOW:
+            self.low_active += 1
+
+    async def acquire(self, priority):
+        if not self.waiters and self._can_start(priority):
+            self._take(priority)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), future))
+        # LOW limiti tufayli kutayotganlar bo'lsa ham, yuqori ustuvorlik bo'sh joyni darhol oladi
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Joy berilgan, lekin vazifa bekor qilindi - joy qaytariladi
+                self.release(priority)
+            raise
+
+    def release(self, priority):
+        self.active -= 1
+        if priority >= LOW:
+            self.low_active -= 1
+        self._wake()
+
+    def _wake(self):
+        waiters = self.waiters
+        while waiters:
+            priority, _, future = waiters[0]
+            if future.done():
+                heapq.heappop(waiters)
+                continue
+            # Navbat boshida LOW turgan bo'lsa, qolganlari ham LOW - limit to'lsa to'xtaymiz
+            if not self._can_start(priority):
+                return
+            heapq.heappop(waiters)
+            self._take(priority)
+            future.set_result(None)
+
+
+class PriorityRequestMiddleware(BaseRequestMiddleware):
+    def __init__(self, gate):
+        self.gate = gate
+
+    async def __call__(self, make_request, bot, method):
+        # Long polling so'rovi joy egallamasligi kerak
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+        priority = request_priority.get()
+        await self.gate.acquire(priority)
+        try:
+            return await make_request(bot, method)
+        finally:
+            self.gate.release(priority)
+
+
+class JobRunner:
+    # Past ustuvorlikdagi fon ishlari: bir vaqtda `concurrency` tadan ko'p emas,
+    # og'ir CPU ishlari esa moderatsiya ishlatadigan oqimlardan alohida executorda
+    def __init__(self, concurrency, cpu_workers=1):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="low")
+        self.tasks = set()
+
+    def submit(self, coro):
+        task = asyncio.create_task(self._run(coro))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _run(self, coro):
+        request_priority.set(LOW)
+        async with self.semaphore:
+            try:
+                await coro
+            except Exception as e:
+                print(f"Fon ishida xato: {e}")
+
+    async def run_cpu(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def stop(self, timeout=5):
+        if self.tasks:
+            done, pending = await asyncio.wait(self.tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    # Klassik token bucket: soniyasiga `rate` ta token, eng ko'pi `capacity` ta
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def try_acquire(self):
+        # Token olinsa 0, aks holda keyingi token uchun kutish vaqtini qaytaradi
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import pickle
+
+# Matcher tuzilishi o'zgarsa versiya oshiriladi, eski snapshotlar avtomatik e'tiborsiz qoladi
+SNAPSHOT_VERSION = 5
+
+
+def snapshot_path(source_path):
+    return source_path + ".snapshot"
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path):
+    try:
+        with open(path, 'rb') as f:
+            return content_hash(f.read())
+    except OSError:
+        return None
+
+
+def load_snapshot(source_path, source_hash):
+    # Manba fayl xeshi mos kelsa, tayyor ro'yxat va matcher qaytariladi, aks holda None
+    if source_hash is None:
+        return None
+    try:
+        with open(snapshot_path(source_path), 'rb') as f:
+            data = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"{snapshot_path(source_path)} snapshotini o'qishda xato: {e}")
+        return None
+    if data.get("version") != SNAPSHOT_VERSION or data.get("hash") != source_hash:
+        return None
+    return data["items"], data["matcher"]
+
+
+def save_snapshot(source_path, source_hash, items, matcher):
+    path = snapshot_path(source_path)
+    tmp_path = path + ".tmp"
+    data = {"version": SNAPSHOT_VERSION, "hash": source_hash, "items": items, "matcher": matcher}
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Yarim yozilgan snapshot hech qachon o'qilmasligi uchun atomik almashtiriladi
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"{path} snapshotini yozishda xato: {e}")
@@ -0,0 +1,16 @@
+import importlib
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def main(tmp_path_factory):
+    # Baza va FSM fayllari vaqtinchalik papkada yaratiladi
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("bot"))
+    try:
+        yield importlib.import_module("main")
+    finally:
+        os.chdir(cwd)
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from aiogram import types
+
+
+def group_update(chat_id, text):
+    return {
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "date": int(datetime.now().timestamp()),
+            "chat": {"id": chat_id, "type": "supergroup", "title": "G"},
+            "from": {"id": 7, "is_bot": False, "first_name": "Spam"},
+            "text": text,
+        },
+    }
+
+
+TEXT = "Arzon kredit oling, batafsil ma'lumot uchun profilga yozing!!!"
+
+
+def test_raw_and_parsed_messages_share_stable_key(main):
+    raw = group_update(-1, TEXT)
+    message = types.Update.model_validate(raw).message
+    key = main.raw_duplicate_key(raw["message"])
+    assert key == main.duplicate_key(message)
+    # Jarayonga bog'liq tuz yo'q: kalit har safar bir xil baytlar
+    assert key == main.content_key(None, TEXT)
+    assert isinstance(key, bytes)
+
+
+def test_master_counts_spam_wave_across_shards(main):
+    main.duplicate_settings.update(enabled=True, min_text_length=30)
+    main.duplicate_detector.configure(3, 600, 3600, 1000)
+    # Guruhlar turli ishchilarga tushadi, lekin hisob asosiy jarayonda
+    verdicts = [main.shard_duplicate_verdict(group_update(chat_id, TEXT)) for chat_id in (-11, -12, -13, -14)]
+    assert verdicts == [(False, False), (False, False), (True, True), (True, False)]
+
+
+def test_private_and_short_messages_are_not_counted(main):
+    main.duplicate_settings.update(enabled=True, min_text_length=30)
+    update = group_update(-11, TEXT)
+    update["message"]["chat"] = {"id": 7, "type": "private", "first_name": "Spam"}
+    assert main.shard_duplicate_verdict(update) is None
+    assert main.shard_duplicate_verdict(group_update(-11, "salom")) is None
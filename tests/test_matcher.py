@@ -0,0 +1,34 @@
+from matcher import BannedMatcher, NgramIndex
+
+DISTANCES = [[5, 1], [9, 2]]
+
+
+def test_fuzzy_finds_misspelled_words():
+    matcher = BannedMatcher(["narkotik", "kazino"])
+    assert matcher.find_fuzzy(["narkotikk", "kazina", "salom"], DISTANCES) == [
+        ("narkotikk", "narkotik"), ("kazina", "kazino"),
+    ]
+
+
+def test_add_and_remove_update_fuzzy_index_in_place():
+    matcher = BannedMatcher(["narkotik"])
+    index = matcher.index
+    assert matcher.find_fuzzy(["kazina"], DISTANCES) == []
+    matcher.add("kazino")
+    assert matcher.index is index
+    assert matcher.find_fuzzy(["kazina"], DISTANCES) == [("kazina", "kazino")]
+    matcher.remove("kazino")
+    assert matcher.find_fuzzy(["kazina"], DISTANCES) == []
+    assert "kazino" not in index.sizes
+
+
+def test_incremental_index_matches_fresh_build():
+    words = ["alfa", "beta", "gamma", "delta", "epsilon"]
+    index = NgramIndex()
+    for word in words + ["omega"]:
+        index.add(word)
+    index.remove("omega")
+    fresh = NgramIndex(words)
+    assert index.postings == fresh.postings
+    assert index.lengths == fresh.lengths
+    assert index.sizes == fresh.sizes
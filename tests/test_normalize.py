@@ -0,0 +1,23 @@
+from normalize import normalize, tokenize
+
+
+def test_cyrillic_transliterated_to_latin():
+    assert normalize("наркотик") == "narkotik"
+    assert normalize("порно") == "porno"
+    assert normalize("ер") == "yer"
+
+
+def test_latin_lookalike_inside_cyrillic_word():
+    assert normalize("нaркотик") == normalize("наркотик")
+    assert normalize("пoрно") == normalize("порно")
+    assert normalize("сeкс") == "seks"
+
+
+def test_cyrillic_lookalike_inside_latin_word():
+    assert normalize("рorn") == "porn"
+    assert normalize("pоrn") == "porn"
+    assert normalize("sеks") == "seks"
+
+
+def test_mixed_text_folds_each_token_separately():
+    assert tokenize("Yomoooon нaркотик рorn!") == ["yomon", "narkotik", "porn"]
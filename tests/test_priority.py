@@ -0,0 +1,75 @@
+import asyncio
+
+from priority import HIGH, LOW, NORMAL, PriorityGate
+
+
+async def start(gate, priority, order):
+    # Joy olingach tartib yozib qo'yiladi
+    await gate.acquire(priority)
+    order.append(priority)
+
+
+def test_high_overtakes_waiting_low():
+    async def run():
+        gate = PriorityGate(slots=1, low_slots=1)
+        await gate.acquire(NORMAL)
+        order = []
+        tasks = [asyncio.create_task(start(gate, LOW, order))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(start(gate, HIGH, order)))
+        await asyncio.sleep(0)
+        gate.release(NORMAL)
+        await asyncio.sleep(0)
+        assert order == [HIGH]
+        gate.release(HIGH)
+        await asyncio.gather(*tasks)
+        assert order == [HIGH, LOW]
+
+    asyncio.run(run())
+
+
+def test_low_slots_limit_background_requests():
+    async def run():
+        gate = PriorityGate(slots=3, low_slots=1)
+        await gate.acquire(LOW)
+        order = []
+        low = asyncio.create_task(start(gate, LOW, order))
+        await asyncio.sleep(0)
+        # Bo'sh joy bor, lekin LOW limiti to'lgan
+        assert order == [] and gate.low_active == 1
+        await asyncio.wait_for(gate.acquire(HIGH), 1)
+        assert gate.active == 2
+        gate.release(LOW)
+        await low
+        assert order == [LOW] and gate.low_active == 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_hold_slot():
+    async def run():
+        gate = PriorityGate(slots=1, low_slots=1)
+        await gate.acquire(HIGH)
+        waiting = asyncio.create_task(gate.acquire(HIGH))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        gate.release(HIGH)
+        assert gate.active == 0 and not gate.waiters
+
+    asyncio.run(run())
+
+
+def test_cancel_after_slot_granted_returns_it():
+    async def run():
+        gate = PriorityGate(slots=1, low_slots=1)
+        await gate.acquire(LOW)
+        waiting = asyncio.create_task(gate.acquire(LOW))
+        await asyncio.sleep(0)
+        # Joy berildi, lekin vazifa hali davom etmay turib bekor qilinadi
+        gate.release(LOW)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert gate.active == 0 and gate.low_active == 0
+
+    asyncio.run(run())
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from aiogram import types
+
+
+def resolve_handler(main, chat_type, text):
+    # Dispatcher tanlagan ishlovchi nomini qaytaradi; ishlovchining o'zi chaqirilmaydi
+    reached = []
+
+    async def record(handler, event, data):
+        reached.append(data["handler"].callback.__name__)
+
+    message = types.Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=types.Chat(id=-100 if chat_type != "private" else 42, type=chat_type),
+        from_user=types.User(id=42, is_bot=False, first_name="Test"),
+        text=text,
+    )
+    main.router.message.middleware(record)
+    try:
+        asyncio.run(main.dp.feed_update(main.bot, types.Update(update_id=1, message=message)))
+    finally:
+        main.router.message.middleware.unregister(record)
+    return reached
+
+
+@pytest.mark.parametrize("command, handler", [
+    ("/groups", "groups_list"),
+    ("/update_lists", "update_lists"),
+    ("/export_lists", "export_lists"),
+    ("/admin", "admin_panel"),
+])
+def test_private_admin_commands_reach_handlers(main, command, handler):
+    assert resolve_handler(main, "private", command) == [handler]
+
+
+def test_group_messages_go_to_moderation(main):
+    assert resolve_handler(main, "supergroup", "salom") == ["check_messages"]
+
+
+def test_group_setting_from_non_admin_is_moderated(main):
+    # A'zo admin emasligi keshdan olinadi, getChatMember chaqirilmaydi
+    main.member_admin_cache[(-100, 42)] = (False, float("inf"))
+    assert resolve_handler(main, "supergroup", "/setting buy yomon http://spam") == ["check_messages"]
+
+
+def test_group_setting_from_group_admin(main):
+    main.member_admin_cache[(-100, 42)] = (True, float("inf"))
+    try:
+        assert resolve_handler(main, "supergroup", "/setting") == ["group_setting"]
+    finally:
+        main.member_admin_cache.pop((-100, 42))
+
+
+def test_group_media_commands_from_non_admin_are_moderated(main):
+    assert resolve_handler(main, "supergroup", "/ban_media") == ["check_messages"]
+    assert resolve_handler(main, "supergroup", "/unban_media") == ["check_messages"]
+
+
+def test_media_commands_reach_handlers(main):
+    assert resolve_handler(main, "private", "/ban_media") == ["ban_media"]
+    main.ADMIN_IDS.append(42)
+    try:
+        assert resolve_handler(main, "supergroup", "/unban_media") == ["unban_media"]
+    finally:
+        main.ADMIN_IDS.remove(42)